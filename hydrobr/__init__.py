@@ -3,6 +3,12 @@
 __version__ = '0.1.1'
 
 from hydrobr import get_data
+from hydrobr.cache import Cache
+from hydrobr.compact import CompactFrame
 from hydrobr.graphics import Plot
-from hydrobr.preprocessing import PreProcessing
+from hydrobr.inventory import Inventory
+from hydrobr.load import Load
+from hydrobr.preprocessing import CompletenessIndex, PreProcessing
 from hydrobr.save import SaveAs
+from hydrobr.session import Session
+from hydrobr.spatial import SpatialIndex
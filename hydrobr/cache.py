@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import requests
+import urllib3
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from hydrobr.session import Session
+
+
+class Cache:
+    """
+    Opt-in persistent cache for the responses downloaded by hydrobr.get_data.
+
+    Every request is keyed on its endpoint and parameters and stored as a file in the cache directory. An SQLite index
+    keeps the source, creation time, last access time and size of each entry, so that entries older than the TTL of
+    their source are downloaded again and the least recently used entries are evicted when the cache grows above its
+    size budget.
+    """
+
+    # Time to live, in seconds, of the entries of each source. Historical series rarely change, telemetry and the
+    # recent data requested by the updates of the historical series often do.
+    DEFAULT_TTL = {'ANA': 30 * 86400, 'ANA-update': 3600, 'ANA-telemetric': 3600, 'INMET': 86400, 'ONS': 7 * 86400}
+
+    _path = None
+    _max_size = None
+    _ttl = {}
+    _hits = {}
+    _misses = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def enable(path=None, max_size=2e9, ttl=None):
+        """
+        Enables the cache for all the requests made by hydrobr.get_data.
+
+        Parameters
+        ----------
+        path : string, default None
+            The directory where the responses are stored. If None, uses the 'hydrobr' directory inside
+            $XDG_CACHE_HOME or ~/.cache.
+        max_size : int, float, default 2e9
+            The size budget of the cache in bytes. The least recently used entries are evicted when it is exceeded.
+        ttl : dict, default None
+            The time to live in seconds for each source ('ANA', 'ANA-update', 'ANA-telemetric', 'INMET' and 'ONS').
+            The given sources override the values of Cache.DEFAULT_TTL.
+
+        Returns
+        -------
+        """
+        if path is None:
+            path = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                                'hydrobr')
+        os.makedirs(path, exist_ok=True)
+        with closing(sqlite3.connect(os.path.join(path, 'index.sqlite'))) as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, source TEXT, '
+                               'content_type TEXT, created REAL, accessed REAL, size INTEGER)')
+            connection.commit()
+        Cache._ttl = dict(Cache.DEFAULT_TTL, **(ttl or {}))
+        Cache._max_size = max_size
+        Cache._path = path
+
+    @staticmethod
+    def disable():
+        """
+        Disables the cache. The stored responses are kept on disk.
+
+        Returns
+        -------
+        """
+        Cache._path = None
+
+    @staticmethod
+    def enabled():
+        """
+        Returns True if the cache is enabled.
+        """
+        return Cache._path is not None
+
+    @staticmethod
+    def clear(source=None):
+        """
+        Removes the stored responses.
+
+        Parameters
+        ----------
+        source : string, default None
+            If given, removes only the responses of this source.
+
+        Returns
+        -------
+        """
+        if Cache._path is None:
+            raise Exception('The cache is not enabled.')
+        with Cache._lock:
+            if source is None:
+                shutil.rmtree(Cache._path)
+                Cache.enable(Cache._path, Cache._max_size, Cache._ttl)
+            else:
+                with closing(Cache.__connect()) as connection:
+                    keys = connection.execute('SELECT key FROM entries WHERE source = ?', (source,)).fetchall()
+                    Cache.__remove(connection, [key for key, in keys])
+
+    @staticmethod
+    def stats():
+        """
+        Returns the hit and miss counters of the current process and the number and size of the stored responses.
+
+        Returns
+        -------
+        stats : dict
+        """
+        stats = {'hits': sum(Cache._hits.values()), 'misses': sum(Cache._misses.values()),
+                 'hits_by_source': dict(Cache._hits), 'misses_by_source': dict(Cache._misses),
+                 'entries': 0, 'size': 0}
+        if Cache._path is not None:
+            with closing(Cache.__connect()) as connection:
+                stats['entries'], stats['size'] = connection.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return stats
+
+    @staticmethod
+    def reset_stats():
+        """
+        Resets the hit and miss counters.
+
+        Returns
+        -------
+        """
+        Cache._hits = {}
+        Cache._misses = {}
+
+    @staticmethod
+    def __connect():
+        return sqlite3.connect(os.path.join(Cache._path, 'index.sqlite'), timeout=60.0, isolation_level=None)
+
+    @staticmethod
+    def __remove(connection, keys):
+        for key in keys:
+            connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+            try:
+                os.remove(os.path.join(Cache._path, key))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def __count(counter, source):
+        with Cache._lock:
+            counter[source] = counter.get(source, 0) + 1
+
+    @staticmethod
+    def __key(url, params):
+        return hashlib.sha256(json.dumps([url, sorted((params or {}).items())]).encode()).hexdigest()
+
+    @staticmethod
+    def lookup(url, params=None, source='ANA'):
+        """
+        Looks for a fresh stored response of a request, counting a hit or a miss.
+
+        Parameters
+        ----------
+        url : string
+            The endpoint of the request.
+        params : dict, default None
+            The query parameters of the request.
+        source : string, default 'ANA'
+            The source of the data, which defines the TTL of the stored response.
+
+        Returns
+        -------
+        entry : tuple or None
+            The path of the stored body and its content type, or None if there is no fresh stored response.
+        """
+        path = Cache._path
+        key = Cache.__key(url, params)
+        now = time.time()
+        with closing(Cache.__connect()) as connection:
+            entry = connection.execute('SELECT content_type, created FROM entries WHERE key = ?', (key,)).fetchone()
+            if entry is not None and now - entry[1] <= Cache._ttl.get(source, 0) and os.path.exists(
+                    os.path.join(path, key)):
+                connection.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+                Cache.__count(Cache._hits, source)
+                return os.path.join(path, key), entry[0]
+        Cache.__count(Cache._misses, source)
+        return None
+
+    @staticmethod
+    def store(url, params, source, chunks, content_type=None):
+        """
+        Stores the body of a response, evicting the least recently used responses if the size budget is exceeded.
+
+        Parameters
+        ----------
+        url : string
+            The endpoint of the request.
+        params : dict
+            The query parameters of the request.
+        source : string
+            The source of the data, which defines the TTL of the stored response.
+        chunks : iterable of bytes
+            The body of the response, which is written to disk as it is iterated.
+        content_type : string, default None
+            The Content-Type header of the response.
+
+        Returns
+        -------
+        path : string
+            The path of the stored body.
+        """
+        path = Cache._path
+        key = Cache.__key(url, params)
+        temp_file = os.path.join(path, '{}.{}.tmp'.format(key, threading.get_ident()))
+        try:
+            with open(temp_file, 'wb') as file:
+                for chunk in chunks:
+                    file.write(chunk)
+        except BaseException:
+            os.remove(temp_file)
+            raise
+        size = os.path.getsize(temp_file)
+        os.replace(temp_file, os.path.join(path, key))
+
+        now = time.time()
+        with closing(Cache.__connect()) as connection:
+            connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                               (key, source, content_type, now, now, size))
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total > Cache._max_size:
+                to_remove = []
+                for old_key, old_size in connection.execute(
+                        'SELECT key, size FROM entries WHERE key != ? ORDER BY accessed', (key,)).fetchall():
+                    if total <= Cache._max_size:
+                        break
+                    to_remove.append(old_key)
+                    total -= old_size
+                Cache.__remove(connection, to_remove)
+        return os.path.join(path, key)
+
+    @staticmethod
+    def __response(url, path, content_type):
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        response.headers = CaseInsensitiveDict({'Content-Type': content_type} if content_type else {})
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = urllib3.HTTPResponse(body=open(path, 'rb'), status=200, preload_content=False)
+        return response
+
+    @staticmethod
+    def request(url, params=None, source='ANA', timeout=120.0, stream=False, retry_timeouts=True):
+        """
+        Makes a GET request, returning the stored response if the cache is enabled and holds a fresh copy of it.
+
+        On a miss the response body is streamed into the cache directory and served from there, so even large
+        responses are never fully held in memory. Only successful responses are stored. With stream=True the raw
+        response decodes the transfer encoding, so it can be read directly by a parser.
+
+        Parameters
+        ----------
+        url : string
+            The endpoint of the request.
+        params : dict, default None
+            The query parameters of the request.
+        source : string, default 'ANA'
+            The source of the data, which defines the TTL of the stored response.
+        timeout : float, default 120.0
+            The request timeout in seconds.
+        stream : boolean, default False
+            If True, the response body is not read before returning.
+        retry_timeouts : boolean, default True
+            If False, a request that times out is not retried, see Session.get.
+
+        Returns
+        -------
+        response : requests.Response
+        """
+        if Cache._path is None:
+            response = Session.get(url, params, timeout=timeout, stream=stream, retry_timeouts=retry_timeouts)
+        else:
+            entry = Cache.lookup(url, params, source)
+            if entry is None:
+                response = Session.get(url, params, timeout=timeout, stream=True, retry_timeouts=retry_timeouts)
+                if response.status_code == 200:
+                    path = Cache.store(url, params, source, response.iter_content(chunk_size=1 << 16),
+                                       response.headers.get('Content-Type'))
+                    response.close()
+                    response = Cache.__response(url, path, response.headers.get('Content-Type'))
+            else:
+                response = Cache.__response(url, *entry)
+        if stream:
+            response.raw.decode_content = True
+        return response
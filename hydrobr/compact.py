@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+
+
+class CompactFrame:
+    """
+    Compact storage of the daily series of many stations.
+
+    A wide DataFrame reindexes every station onto the daily range of the oldest one, so most of a large dataset is
+    NaN. A CompactFrame stores only the block of each station, from its first to its last date, concatenated in a
+    single float32 array, with the first date (start) and the length of each block. The wide DataFrame is built only
+    when asked, with to_frame().
+
+    A CompactFrame is returned by ANA.flow, ANA.prec and ANA.stage with compact=True, and is accepted by PreProcessing,
+    CompletenessIndex and SaveAs in place of the wide DataFrame. Indexing it by a station returns its daily series.
+
+    float32 keeps about 7 significant digits. Use dtype=np.float64 to keep the values exactly.
+    """
+
+    def __init__(self, values, starts, lengths, columns):
+        """
+        Parameters
+        ----------
+        values : numpy array
+            The values of the blocks of all the stations, concatenated.
+        starts : numpy array of datetime64[D]
+            The first date of the block of each station.
+        lengths : numpy array of int
+            The number of days of the block of each station.
+        columns : list of strings
+            The code of each station.
+        """
+        self.values = values
+        self.starts = np.asarray(starts, dtype='datetime64[D]')
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)[:-1]]).astype(np.int64)
+        self.columns = pd.Index(columns)
+
+    @staticmethod
+    def from_series(series_list, dtype=np.float32):
+        """
+        Builds a CompactFrame from a list of daily series, each one named by its station code.
+
+        Returns
+        -------
+        compact_frame : hydrobr.CompactFrame
+        """
+        values = np.concatenate([series.values.astype(dtype) for series in series_list] or [np.empty(0, dtype)])
+        starts = [series.index[0].to_datetime64() for series in series_list]
+        return CompactFrame(values, starts, [len(series) for series in series_list],
+                            [series.name for series in series_list])
+
+    @staticmethod
+    def from_frame(data, dtype=np.float32):
+        """
+        Builds a CompactFrame from a daily DataFrame with DatetimeIndex where each column corresponds to a station.
+        The block of each station goes from its first to its last valid date.
+
+        Returns
+        -------
+        compact_frame : hydrobr.CompactFrame
+        """
+        values = data.values
+        valid = ~np.isnan(values)
+        first = valid.argmax(axis=0)
+        last = len(valid) - valid[::-1].argmax(axis=0)
+        # The stations without valid data are kept as blocks of length 0
+        last[~valid.any(axis=0)] = first[~valid.any(axis=0)]
+        blocks = [values[first[i]:last[i], i].astype(dtype) for i in range(values.shape[1])]
+        starts = np.zeros(len(first), dtype='datetime64[D]')
+        if len(data):
+            starts = data.index.values.astype('datetime64[D]')[first]
+        return CompactFrame(np.concatenate(blocks or [np.empty(0, dtype)]), starts, last - first, data.columns)
+
+    @property
+    def index(self):
+        """
+        The daily DatetimeIndex of the wide DataFrame, from the first to the last date of the stations.
+        """
+        return self.__range(np.ones(len(self.columns), dtype=bool))
+
+    def __range(self, stations):
+        stations = stations & (self.lengths > 0)
+        if not stations.any():
+            return pd.DatetimeIndex([])
+        return pd.date_range(CompactFrame.__timestamp(self.starts[stations].min()),
+                             CompactFrame.__timestamp((self.starts + self.lengths - 1)[stations].max()), freq='D')
+
+    @staticmethod
+    def __timestamp(date):
+        # The dates are converted with the same unit of the indexes built by hydrobr.get_data
+        return pd.Timestamp(date.astype('datetime64[us]'))
+
+    def __positions(self, columns):
+        positions = self.columns.get_indexer(columns)
+        if (positions < 0).any():
+            raise Exception('Please, select valid stations.')
+        return positions
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, station):
+        return station in self.columns
+
+    def __getitem__(self, station):
+        i = self.columns.get_loc(station)
+        index = pd.date_range(CompactFrame.__timestamp(self.starts[i]), periods=self.lengths[i], freq='D')
+        return pd.Series(self.values[self.offsets[i]:self.offsets[i] + self.lengths[i]], index=index, name=station)
+
+    def select(self, columns, start_date=None, end_date=None):
+        """
+        Returns a CompactFrame with only some stations, optionally restricted to a date range.
+
+        Returns
+        -------
+        compact_frame : hydrobr.CompactFrame
+        """
+        positions = self.__positions(columns)
+        starts, ends = self.starts[positions], self.starts[positions] + self.lengths[positions]
+        if start_date is not None:
+            starts = np.maximum(starts, pd.to_datetime(start_date).to_datetime64().astype('datetime64[D]'))
+        if end_date is not None:
+            ends = np.minimum(ends, pd.to_datetime(end_date).to_datetime64().astype('datetime64[D]') + 1)
+        lengths = np.maximum((ends - starts).astype(np.int64), 0)
+        first = self.offsets[positions] + (starts - self.starts[positions]).astype(np.int64)
+        values = np.concatenate([self.values[first[i]:first[i] + lengths[i]] for i in range(len(positions))]
+                                or [self.values[:0]])
+        return CompactFrame(values, starts, lengths, self.columns[positions])
+
+    def to_frame(self, columns=None, start_date=None, end_date=None, dtype=np.float64):
+        """
+        Builds the wide DataFrame, where each column corresponds to a station.
+
+        Parameters
+        ----------
+        columns : list of strings, default None
+            The stations. If None, all the stations.
+        start_date, end_date : int, float, str, default None
+            The date range of the DataFrame. If None, the first and the last dates of the stations.
+            See: pandas.to_datetime documentation if have doubts about the date format
+        dtype : numpy dtype, default np.float64
+            The dtype of the DataFrame.
+
+        Returns
+        -------
+        data : pandas DataFrame
+        """
+        positions = np.arange(len(self.columns)) if columns is None else self.__positions(columns)
+        selected = np.zeros(len(self.columns), dtype=bool)
+        selected[positions] = True
+        index = self.__range(selected)
+        if start_date is not None:
+            index = index[index >= pd.to_datetime(start_date)]
+        if end_date is not None:
+            index = index[index <= pd.to_datetime(end_date)]
+        data = np.full((len(index), len(positions)), np.nan, dtype=dtype)
+        if len(index):
+            first_date = index[0].to_datetime64().astype('datetime64[D]')
+            for column, i in enumerate(positions):
+                row = (self.starts[i] - first_date).astype(np.int64)
+                block = self.values[self.offsets[i]:self.offsets[i] + self.lengths[i]]
+                begin, end = max(row, 0), min(row + self.lengths[i], len(index))
+                if begin < end:
+                    data[begin:end, column] = block[begin - row:end - row]
+        return pd.DataFrame(data, index=index, columns=self.columns[positions])
+
+    def to_long(self):
+        """
+        Builds the long DataFrame of the valid values, with the Station, Date and Value columns.
+
+        Returns
+        -------
+        data : pandas DataFrame
+        """
+        stations = np.repeat(np.arange(len(self.columns)), self.lengths)
+        days = np.arange(len(self.values)) - np.repeat(self.offsets, self.lengths)
+        dates = np.repeat(self.starts, self.lengths) + days
+        valid = ~np.isnan(self.values)
+        return pd.DataFrame({'Station': pd.Categorical.from_codes(stations[valid], self.columns),
+                             'Date': dates[valid].astype('datetime64[ns]'), 'Value': self.values[valid]})
+
+    def chunks(self, size=1024, start_date=None, end_date=None):
+        """
+        Iterates over wide DataFrames of up to size stations, so the stations can be processed with bounded memory.
+
+        Returns
+        -------
+        chunks : generator of pandas DataFrame
+        """
+        for first in range(0, len(self.columns), size):
+            yield self.to_frame(self.columns[first:first + size], start_date, end_date)
+
+    def notna(self):
+        """
+        Returns the boolean wide DataFrame of the valid values, which takes one byte per station and day.
+
+        Returns
+        -------
+        valid : pandas DataFrame
+        """
+        index = self.index
+        valid = np.zeros((len(index), len(self.columns)), dtype=bool)
+        if len(index):
+            first_date = index[0].to_datetime64().astype('datetime64[D]')
+            for i in range(len(self.columns)):
+                row = (self.starts[i] - first_date).astype(np.int64)
+                block = self.values[self.offsets[i]:self.offsets[i] + self.lengths[i]]
+                valid[row:row + self.lengths[i], i] = ~np.isnan(block)
+        return pd.DataFrame(valid, index=index, columns=self.columns)
+
+    def memory_usage(self):
+        """
+        Returns the memory used by the CompactFrame in bytes.
+        """
+        return self.values.nbytes + self.starts.nbytes + self.lengths.nbytes + self.offsets.nbytes
+
+    @staticmethod
+    def memory_report(data):
+        """
+        Reports the memory of a dataset in each layout: the wide DataFrame in float64 and float32, the CompactFrame
+        in float32, and the long DataFrame of the valid values.
+
+        Parameters
+        ----------
+        data : pandas DataFrame or hydrobr.CompactFrame
+            The dataset.
+
+        Returns
+        -------
+        report : pandas DataFrame
+            The memory of each layout in MB.
+        """
+        compact = data if isinstance(data, CompactFrame) else CompactFrame.from_frame(data)
+        if compact.values.dtype != np.float32:
+            compact = CompactFrame(compact.values.astype(np.float32), compact.starts, compact.lengths,
+                                   compact.columns)
+        cells = len(compact) * len(compact.columns)
+        n_valid = int((~np.isnan(compact.values)).sum())
+        # The long layout stores a categorical code (int16 up to 32767 stations), a datetime64 and a float32 per value
+        code_size = 2 if len(compact.columns) < 2 ** 15 else 4
+        memory = {'wide float64': cells * 8, 'wide float32': cells * 4, 'compact float32': compact.memory_usage(),
+                  'long float32': n_valid * (code_size + 8 + 4)}
+        return pd.DataFrame({'Memory (MB)': {layout: size / 2 ** 20 for layout, size in memory.items()}})
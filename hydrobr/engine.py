@@ -0,0 +1,536 @@
+import asyncio
+import queue
+from math import ceil
+from multiprocessing.pool import ThreadPool
+
+import pandas as pd
+from tqdm import tqdm
+
+from hydrobr.cache import Cache
+from hydrobr.session import Session
+
+
+class AsyncEngine:
+    """
+    Makes many GET requests concurrently with asyncio over a single pooled aiohttp client.
+
+    The number of requests in flight is bounded by `concurrency`, and the connections opened to each host by
+    `per_host`. The connections are reused across the requests, and cancelling the run (e.g. with a KeyboardInterrupt)
+    cancels all the pending requests. Failed requests are retried with the policy of hydrobr.Session, and are counted
+    in its statistics. The responses stored by hydrobr.Cache are used when the cache is enabled.
+
+    Used as a context manager, the engine keeps a single event loop and client open for all the calls to get inside
+    the block, so the connections are also reused across the calls.
+
+    Requires aiohttp (pip install aiohttp).
+
+    Example
+    -------
+    >>> with AsyncEngine(concurrency=20) as engine:
+    ...     first = engine.get(requests, source='ANA')
+    ...     second = engine.get(more_requests, source='ANA')
+    """
+
+    def __init__(self, concurrency=10, per_host=None, timeout=120.0, progress=True, on_timeout=None):
+        """
+        Parameters
+        ----------
+        concurrency : int, default 10
+            The maximum number of requests in flight.
+        per_host : int, default None
+            The maximum number of connections to the same host. If None, only `concurrency` applies.
+        timeout : float, default 120.0
+            The timeout in seconds of each request.
+        progress : boolean, default True
+            If True, shows a progress bar of the requests.
+        on_timeout : object, default None
+            The result of the requests that time out or get a 504 response. By default None, as for the other failed
+            requests. If given, these requests are not retried, since the caller handles them, e.g. by splitting them
+            in smaller requests.
+        """
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("The 'async' engine requires aiohttp. Install it with 'pip install aiohttp'.")
+        self.aiohttp = aiohttp
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.progress = progress
+        self.on_timeout = on_timeout
+        self.__loop = None
+        self.__pool = None
+        self.__session = None
+
+    def __enter__(self):
+        self.__loop = asyncio.new_event_loop()
+        try:
+            asyncio.get_running_loop()
+            # Inside a running event loop (e.g. Jupyter) the requests run in another thread
+            self.__pool = ThreadPool(1)
+        except RuntimeError:
+            self.__pool = None
+        self.__session = self.__run(self.__open())
+        return self
+
+    def __exit__(self, *args):
+        try:
+            self.__run(self.__session.close())
+            self.__run(self.__loop.shutdown_asyncgens())
+            if hasattr(self.__loop, 'shutdown_default_executor'):
+                self.__run(self.__loop.shutdown_default_executor())
+        finally:
+            self.__loop.close()
+            if self.__pool is not None:
+                self.__pool.close()
+            self.__loop, self.__pool, self.__session = None, None, None
+
+    def __run(self, coroutine):
+        # Runs a coroutine in the event loop kept open by the context manager
+        if self.__pool is None:
+            return self.__loop.run_until_complete(coroutine)
+        return self.__pool.apply(self.__loop.run_until_complete, (coroutine,))
+
+    async def __open(self):
+        connector = self.aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host or 0)
+        timeout = self.aiohttp.ClientTimeout(total=self.timeout)
+        return self.aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def __fetch(self, session, semaphore, position, url, params, source, parse):
+        async with semaphore:
+            content = await self.__download(session, url, params, source)
+            if parse is None or content is None or content is self.on_timeout:
+                return content
+            # The body is parsed as soon as it arrives, in a worker thread so the other requests go on, and only the
+            # parsed value is kept
+            return await asyncio.get_running_loop().run_in_executor(None, parse, position, content)
+
+    async def __download(self, session, url, params, source):
+        if Cache.enabled():
+            entry = Cache.lookup(url, params, source)
+            if entry is not None:
+                with open(entry[0], 'rb') as file:
+                    return file.read()
+        attempt = 0
+        while True:
+            try:
+                async with session.get(url, params=params) as response:
+                    content = await response.read()
+                if response.status < 500 or attempt == Session.retries or (
+                        response.status == 504 and self.on_timeout is not None):
+                    break
+            except (self.aiohttp.ClientError, asyncio.TimeoutError) as error:
+                # A connection that could not be opened is not a request that timed out
+                timed_out = isinstance(error, asyncio.TimeoutError) and not isinstance(
+                    error, getattr(self.aiohttp, 'ConnectionTimeoutError', ()))
+                if attempt == Session.retries or (timed_out and self.on_timeout is not None):
+                    Session.record(n_requests=1, n_retries=attempt, n_failures=1)
+                    return self.on_timeout if timed_out else None
+            await asyncio.sleep(Session.delay(attempt))
+            attempt += 1
+        Session.record(n_requests=1, n_retries=attempt, n_failures=int(response.status >= 500), n_bytes=len(content))
+        if response.status == 504:
+            return self.on_timeout
+        if response.status != 200:
+            return None
+        if Cache.enabled():
+            Cache.store(url, params, source, [content], response.headers.get('Content-Type'))
+        return content
+
+    async def fetch(self, requests, source, parse=None):
+        """
+        Coroutine that makes the requests, for use inside a running event loop.
+
+        Parameters
+        ----------
+        requests : list of tuples
+            The (url, params) of each request, where params is a dict or None.
+        source : string
+            The source of the data, used by hydrobr.Cache.
+        parse : callable, default None
+            Receives the position of a request in requests and the body of its response, and returns the value kept
+            in place of the body. The bodies are parsed as they arrive, so at most `concurrency` of them are held in
+            memory at once.
+
+        Returns
+        -------
+        contents : list of bytes
+            The body, or its parsed value, of each response in the order of the requests, or None (or on_timeout) for
+            the failed requests.
+        """
+        async with await self.__open() as session:
+            return await self.__gather(session, requests, source, parse)
+
+    async def __gather(self, session, requests, source, parse):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [asyncio.ensure_future(self.__fetch(session, semaphore, position, url, params, source, parse))
+                 for position, (url, params) in enumerate(requests)]
+        try:
+            for task in tqdm(asyncio.as_completed(tasks), total=len(tasks), disable=not self.progress):
+                await task
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return [task.result() for task in tasks]
+
+    def get(self, requests, source, parse=None):
+        """
+        Makes the requests and waits for all of them, over the client of the context manager if the engine is used
+        as one.
+
+        Parameters
+        ----------
+        requests : list of tuples
+            The (url, params) of each request, where params is a dict or None.
+        source : string
+            The source of the data, used by hydrobr.Cache.
+        parse : callable, default None
+            Receives the position of a request in requests and the body of its response, and returns the value kept
+            in place of the body. The bodies are parsed as they arrive, so at most `concurrency` of them are held in
+            memory at once.
+
+        Returns
+        -------
+        contents : list of bytes
+            The body, or its parsed value, of each response in the order of the requests, or None (or on_timeout) for
+            the failed requests.
+        """
+        if self.__session is not None:
+            return self.__run(self.__gather(self.__session, requests, source, parse))
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.fetch(requests, source, parse))
+        # Inside a running event loop (e.g. Jupyter) the requests run in their own loop in another thread
+        with ThreadPool(1) as pool:
+            return pool.apply(asyncio.run, (self.fetch(requests, source, parse),))
+
+
+def _parse(parse, content):
+    # The parsed body of a response of the 'async' engine, keeping the failures and counting the bodies that can not
+    # be parsed as failures
+    if content is None or content is WindowPlanner.TIMEOUT:
+        return content
+    try:
+        return parse(content)
+    except Exception:
+        return None
+
+
+class WindowPlanner:
+    """
+    Splits the date range of a station into the windows requested to the provider, adapting their size to the
+    responses.
+
+    The windows are requested in waves of `wave` consecutive windows. After each wave the window size doubles while the
+    largest response has less than half of `threshold` records, so the empty years before a station started operating
+    cost only a few requests, and halves when a response has more than `threshold` records. A window whose request
+    times out is not retried but split in two halves that are requested again, down to `min_size` days, while a
+    request that fails otherwise, e.g. with a 4xx response or an invalid body, stops the planner, since a smaller
+    window would fail as well. The number of requests saved in relation to fixed windows of the initial size is added
+    to the hydrobr.Session statistics.
+    """
+
+    # The response of a window whose request timed out
+    TIMEOUT = object()
+
+    def __init__(self, start, end, size, threshold, min_size=1, max_size=3650, wave=10):
+        """
+        Parameters
+        ----------
+        start, end : pandas Timestamp
+            The first and last dates of the range, both included.
+        size : int
+            The initial window size in days.
+        threshold : int
+            The number of records of a response above which the windows shrink.
+        min_size : int, default 1
+            The minimum window size in days.
+        max_size : int, default 3650
+            The maximum window size in days.
+        wave : int, default 10
+            The number of windows requested at the same time.
+        """
+        self.start = pd.Timestamp(start).normalize()
+        self.end = pd.Timestamp(end).normalize()
+        self.size = size
+        self.threshold = threshold
+        self.min_size = min_size
+        self.max_size = max_size
+        self.wave = wave
+        self.__size = size
+        self.__cursor = self.start
+        self.__pending = []
+        self.__responses = {}
+        self.__n_requests = 0
+
+    @property
+    def done(self):
+        """
+        True when all the windows were requested and received.
+        """
+        return self.__cursor > self.end and not self.__pending
+
+    def next_wave(self):
+        """
+        Returns the next windows to request, up to `wave` windows: first the halves of the failed windows, then new
+        windows of the current size.
+
+        Returns
+        -------
+        windows : list of tuples
+            The (start, end) of each window.
+        """
+        day = pd.Timedelta(days=1)
+        windows = self.__pending[:self.wave]
+        self.__pending = self.__pending[self.wave:]
+        while len(windows) < self.wave and self.__cursor <= self.end:
+            window_end = min(self.__cursor + (self.__size - 1) * day, self.end)
+            windows.append((self.__cursor, window_end))
+            self.__cursor = window_end + day
+        self.__n_requests += len(windows)
+        return windows
+
+    def feed(self, windows, responses):
+        """
+        Takes the responses of a wave, adapting the window size to them.
+
+        Parameters
+        ----------
+        windows : list of tuples
+            The windows returned by next_wave.
+        responses : list of pandas DataFrame
+            The response of each window, WindowPlanner.TIMEOUT for the requests that timed out, or None for the
+            requests that failed otherwise.
+
+        Returns
+        -------
+        days : int
+            The number of days received.
+        """
+        day = pd.Timedelta(days=1)
+        largest = 0
+        days = 0
+        for window, response in zip(windows, responses):
+            length = (window[1] - window[0]).days + 1
+            if response is WindowPlanner.TIMEOUT:
+                if length <= self.min_size:
+                    raise Exception('It was not possible to get the data, please verify your connection and try '
+                                    'again.')
+                middle = window[0] + (length // 2 - 1) * day
+                self.__pending = [(window[0], middle), (middle + day, window[1])] + self.__pending
+                self.__size = max(self.min_size, self.__size // 2)
+            elif response is None:
+                raise Exception('It was not possible to get the data, please verify your connection and try again.')
+            else:
+                self.__responses[window[0]] = response
+                largest = max(largest, len(response))
+                days += length
+        if largest > self.threshold:
+            self.__size = max(self.min_size, self.__size // 2)
+        elif largest < self.threshold / 2 and not self.__pending:
+            self.__size = min(self.max_size, self.__size * 2)
+        return days
+
+    def responses(self):
+        """
+        Returns the responses in chronological order, adding the requests saved in relation to fixed windows of the
+        initial size to the hydrobr.Session statistics.
+
+        Returns
+        -------
+        responses : list of pandas DataFrame
+        """
+        fixed = ceil(((self.end - self.start).days + 1) / self.size)
+        Session.record(n_saved=max(0, fixed - self.__n_requests))
+        return [self.__responses[start] for start in sorted(self.__responses)]
+
+    def run(self, call_request, request, parse, source, engine='threads'):
+        """
+        Requests all the windows with the selected engine.
+
+        Parameters
+        ----------
+        call_request : callable
+            Used by the 'threads' engine. Receives a (start, end) window and returns its response as a DataFrame,
+            WindowPlanner.TIMEOUT if the request timed out, or None if it failed otherwise.
+        request : callable
+            Used by the 'async' engine. Receives a (start, end) window and returns the (url, params) of its request.
+        parse : callable
+            Used by the 'async' engine. Receives the body of a response and returns it as a DataFrame. A body it
+            fails to parse counts as a failed request.
+        source : string
+            The source of the data, used by hydrobr.Cache.
+        engine : string, default 'threads'
+            'threads' or 'async', see AsyncEngine.
+
+        Returns
+        -------
+        responses : list of pandas DataFrame
+            The responses in chronological order.
+        """
+        if engine == 'async':
+            # All the waves are requested over the same client
+            with AsyncEngine(self.wave, progress=False, on_timeout=WindowPlanner.TIMEOUT) as async_engine:
+                def fetch(windows):
+                    contents = async_engine.get([request(window) for window in windows], source)
+                    return [_parse(parse, content) for content in contents]
+
+                return self.__run(fetch)
+        elif engine == 'threads':
+            Session.resize(self.wave)
+            with ThreadPool(self.wave) as pool:
+                return self.__run(lambda windows: pool.map(call_request, windows))
+        else:
+            raise Exception('Please, select a valid engine.')
+
+    def __run(self, fetch):
+        progress = tqdm(total=(self.end - self.start).days + 1, unit='day')
+        try:
+            while not self.done:
+                windows = self.next_wave()
+                progress.update(self.feed(windows, fetch(windows)))
+        finally:
+            progress.close()
+        return self.responses()
+
+
+class WindowScheduler:
+    """
+    Requests the windows of many WindowPlanners, e.g. one per station, on a single bounded pool.
+
+    With the 'threads' engine the windows of all the planners share a pool of `threads` threads, and the next wave of
+    a planner is submitted as soon as its previous wave returns, so a slow planner does not hold the others. With the
+    'async' engine the next waves of the planners are requested together, in rounds of about `threads` requests over
+    a single AsyncEngine client. The responses of each planner are yielded as soon as all its windows are received.
+    """
+
+    def __init__(self, threads=10, engine='threads', progress=True):
+        """
+        Parameters
+        ----------
+        threads : int, default 10
+            The maximum number of requests in flight.
+        engine : string, default 'threads'
+            'threads' or 'async', see AsyncEngine.
+        progress : boolean, default True
+            If True, shows a progress bar of the finished planners.
+        """
+        if engine not in ['threads', 'async']:
+            raise Exception('Please, select a valid engine.')
+        self.threads = threads
+        self.engine = engine
+        self.progress = progress
+
+    def run(self, jobs, source):
+        """
+        Generator that requests the windows of all the jobs.
+
+        Parameters
+        ----------
+        jobs : list of tuples
+            The (key, planner, call_request, request, parse) of each job, where call_request, request and parse are
+            used as in WindowPlanner.run.
+        source : string
+            The source of the data, used by hydrobr.Cache.
+
+        Yields
+        ------
+        key, responses
+            The key of a finished job and its responses in chronological order, or None if its data could not be
+            requested.
+        """
+        progress = tqdm(total=len(jobs), disable=not self.progress)
+        try:
+            if self.engine == 'async':
+                results = self.__run_async(jobs, source)
+            else:
+                results = self.__run_threads(jobs)
+            for key, responses in results:
+                progress.update(1)
+                yield key, responses
+        finally:
+            progress.close()
+
+    @staticmethod
+    def __feed(job, windows, responses):
+        # Feeds a wave to the planner of the job, returning its responses once it is done
+        try:
+            job[1].feed(windows, responses)
+        except Exception:
+            return True, None
+        if job[1].done:
+            return True, job[1].responses()
+        return False, None
+
+    def __run_threads(self, jobs):
+        Session.resize(self.threads)
+        finished = queue.Queue()
+        waiting = list(reversed(jobs))
+        waves = {}
+        with ThreadPool(self.threads) as pool:
+            def submit(job):
+                windows = job[1].next_wave()
+                waves[job[0]] = (job, windows, [None] * len(windows), [len(windows)])
+                for i, window in enumerate(windows):
+                    pool.apply_async(job[2], (window,), callback=lambda response, key=job[0], i=i: finished.put(
+                        (key, i, response)), error_callback=lambda error, key=job[0], i=i: finished.put((key, i, None)))
+                return len(windows)
+
+            in_flight = 0
+            while waiting or waves:
+                # New jobs start while there are free threads
+                while waiting and in_flight < self.threads:
+                    job = waiting.pop()
+                    if job[1].done:
+                        # Nothing to request, e.g. a range that starts in the future
+                        yield job[0], job[1].responses()
+                        continue
+                    in_flight += submit(job)
+                if not waves:
+                    continue
+                key, i, response = finished.get()
+                in_flight -= 1
+                job, windows, responses, remaining = waves[key]
+                responses[i] = response
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    del waves[key]
+                    done, result = WindowScheduler.__feed(job, windows, responses)
+                    if done:
+                        yield key, result
+                    else:
+                        in_flight += submit(job)
+
+    def __run_async(self, jobs, source):
+        # All the rounds are requested over the same client
+        with AsyncEngine(self.threads, progress=False, on_timeout=WindowPlanner.TIMEOUT) as async_engine:
+            yield from self.__rounds(async_engine, jobs, source)
+
+    def __rounds(self, async_engine, jobs, source):
+        waiting = list(reversed(jobs))
+        active = []
+        while waiting or active:
+            # The round takes the next wave of the active jobs, and starts new jobs while it has free requests
+            waves = [(job, job[1].next_wave()) for job in active]
+            n_requests = sum(len(windows) for _, windows in waves)
+            while waiting and n_requests < self.threads:
+                job = waiting.pop()
+                if job[1].done:
+                    yield job[0], job[1].responses()
+                    continue
+                active.append(job)
+                waves.append((job, job[1].next_wave()))
+                n_requests += len(waves[-1][1])
+            if not waves:
+                continue
+            contents = async_engine.get([job[3](window) for job, windows in waves for window in windows], source)
+            position = 0
+            for job, windows in waves:
+                responses = [_parse(job[4], content) for content in contents[position:position + len(windows)]]
+                position += len(windows)
+                done, result = WindowScheduler.__feed(job, windows, responses)
+                if done:
+                    active.remove(job)
+                    yield job[0], result
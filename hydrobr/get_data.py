@@ -1,13 +1,21 @@
-import calendar
-import datetime
+import http.client
+import io
 import json
 import pandas as pd
 import requests
+import threading
+import time
+import urllib3
 import xml.etree.ElementTree as ET
 from tqdm import tqdm
 import numpy as np
 from multiprocessing.pool import ThreadPool
 import warnings
+from hydrobr.cache import Cache
+from hydrobr.compact import CompactFrame
+from hydrobr.engine import AsyncEngine, WindowPlanner, WindowScheduler
+from hydrobr.inventory import Inventory
+from hydrobr.session import Session
 
 
 class ANA:
@@ -15,58 +23,77 @@ class ANA:
     It provides a connection with the Brazilian National Water Agency (Agência Nacional de Águas - ANA) database
     """
 
+    @staticmethod
+    def __iter_xml(source, tag):
+        # Parses a streamed XML response incrementally, yielding each `tag` element and dropping it from the tree
+        # once it is consumed, so the memory use does not grow with the size of the response.
+        parents = []
+        for event, element in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                parents.append(element)
+                continue
+            parents.pop()
+            if element.tag == tag:
+                yield element
+                if parents:
+                    parents[-1].remove(element)
+                element.clear()
+
     @staticmethod
     def __list_ana(params, telemetry=False):
+        # Each field is collected as a column list and the DataFrame is built once at the end
         if telemetry:
-            response = requests.get('http://telemetriaws1.ana.gov.br/ServiceANA.asmx/ListaEstacoesTelemetricas', params,
-                                    timeout=120.0)
-            tree = ET.ElementTree(ET.fromstring(response.content))
-            root = tree.getroot()
-            list_stations = pd.DataFrame()
-            index = 1
-            for station in tqdm(root.iter('Table')):
-                list_stations.at[index, 'Name'] = station.find('NomeEstacao').text
+            response = Cache.request('http://telemetriaws1.ana.gov.br/ServiceANA.asmx/ListaEstacoesTelemetricas',
+                                     params, source='ANA-telemetric', stream=True)
+            columns = {'Name': [], 'Code': [], 'Status': [], 'SubBasin': [], 'City-State': [], 'Origem': [],
+                       'Responsible': [], 'Elevation': [], 'Latitude': [], 'Longitude': []}
+            for station in tqdm(ANA.__iter_xml(response.raw, 'Table')):
+                columns['Name'].append(station.find('NomeEstacao').text)
                 code = station.find('CodEstacao').text
-                list_stations.at[index, 'Code'] = f'{int(code):08}'
-                list_stations.at[index, 'Status'] = station.find('StatusEstacao').text
-                list_stations.at[index, 'SubBasin'] = station.find('SubBacia').text
+                columns['Code'].append(f'{int(code):08}')
+                columns['Status'].append(station.find('StatusEstacao').text)
+                columns['SubBasin'].append(station.find('SubBacia').text)
                 try:
-                    list_stations.at[index, 'City-State'] = station.find('Municipio-UF').text
+                    columns['City-State'].append(station.find('Municipio-UF').text)
                 except AttributeError:
-                    list_stations.at[index, 'City-State'] = np.nan
-                list_stations.at[index, 'Origem'] = station.find('Origem').text
-                list_stations.at[index, 'Responsible'] = station.find('Responsavel').text
-                list_stations.at[index, 'Elevation'] = station.find('Altitude').text
-                list_stations.at[index, 'Latitude'] = float(station.find('Latitude').text)
-                list_stations.at[index, 'Longitude'] = float(station.find('Longitude').text)
-                index += 1
+                    columns['City-State'].append(np.nan)
+                columns['Origem'].append(station.find('Origem').text)
+                columns['Responsible'].append(station.find('Responsavel').text)
+                columns['Elevation'].append(station.find('Altitude').text)
+                columns['Latitude'].append(station.find('Latitude').text)
+                columns['Longitude'].append(station.find('Longitude').text)
+            numeric = ['Elevation', 'Latitude', 'Longitude']
         else:
             check_params = ['codEstDE', 'codEstATE', 'tpEst', 'nmEst', 'nmRio', 'codSubBacia',
                             'codBacia', 'nmMunicipio', 'nmEstado', 'sgResp', 'sgOper', 'telemetrica']
             if list(params.keys()) != check_params:
                 raise Exception('You must pass the dictionary with the standard keys.')
-            response = requests.get('http://telemetriaws1.ana.gov.br/ServiceANA.asmx/HidroInventario', params,
-                                    timeout=120.0)
-            tree = ET.ElementTree(ET.fromstring(response.content))
-            root = tree.getroot()
-            list_stations = pd.DataFrame()
-            index = 1
             if params['tpEst'] != '1' and params['tpEst'] != '2':
                 raise Exception('Please choose a station type on the tpEst parameter.')
-            for station in tqdm(root.iter('Table')):
-                list_stations.at[index, 'Name'] = station.find('Nome').text
+            response = Cache.request('http://telemetriaws1.ana.gov.br/ServiceANA.asmx/HidroInventario', params,
+                                     source='ANA', stream=True)
+            columns = {'Name': [], 'Code': [], 'Type': [], 'DrainageArea': [], 'SubBasin': [], 'City': [],
+                       'State': [], 'Responsible': [], 'Latitude': [], 'Longitude': []}
+            numeric = ['DrainageArea', 'Latitude', 'Longitude']
+            if params['tpEst'] != '1':
+                del columns['DrainageArea']
+                numeric.remove('DrainageArea')
+            for station in tqdm(ANA.__iter_xml(response.raw, 'Table')):
+                columns['Name'].append(station.find('Nome').text)
                 code = station.find('Codigo').text
-                list_stations.at[index, 'Code'] = f'{int(code):08}'
-                list_stations.at[index, 'Type'] = station.find('TipoEstacao').text
+                columns['Code'].append(f'{int(code):08}')
+                columns['Type'].append(station.find('TipoEstacao').text)
                 if params['tpEst'] == '1':
-                    list_stations.at[index, 'DrainageArea'] = station.find('AreaDrenagem').text
-                list_stations.at[index, 'SubBasin'] = station.find('SubBaciaCodigo').text
-                list_stations.at[index, 'City'] = station.find('nmMunicipio').text
-                list_stations.at[index, 'State'] = station.find('nmEstado').text
-                list_stations.at[index, 'Responsible'] = station.find('ResponsavelSigla').text
-                list_stations.at[index, 'Latitude'] = float(station.find('Latitude').text)
-                list_stations.at[index, 'Longitude'] = float(station.find('Longitude').text)
-                index += 1
+                    columns['DrainageArea'].append(station.find('AreaDrenagem').text)
+                columns['SubBasin'].append(station.find('SubBaciaCodigo').text)
+                columns['City'].append(station.find('nmMunicipio').text)
+                columns['State'].append(station.find('nmEstado').text)
+                columns['Responsible'].append(station.find('ResponsavelSigla').text)
+                columns['Latitude'].append(station.find('Latitude').text)
+                columns['Longitude'].append(station.find('Longitude').text)
+        response.close()
+        list_stations = pd.DataFrame(columns, index=pd.RangeIndex(1, len(columns['Code']) + 1))
+        list_stations[numeric] = list_stations[numeric].apply(pd.to_numeric, errors='coerce').astype(float)
         return list_stations
 
     @staticmethod
@@ -90,7 +117,7 @@ class ANA:
         source: string, default 'ANAF'
             The source to look for the data. 'ANA' to get the list of stations from the Brazilian National Water Agency
             (ANA) database, or 'ANAF' to get the filtered list of stations that contain only the stations from ANA
-            with registered data.
+            with registered data, which is shipped with hydrobr, see hydrobr.Inventory.
             More information about ANAF: https://doi.org/10.5281/zenodo.3755065
         Returns
         -------
@@ -104,14 +131,7 @@ class ANA:
                       'telemetrica': ''}
             list_stations = ANA.__list_ana(params)
         elif source == 'ANAF':
-            list_stations = pd.read_csv('http://raw.githubusercontent.com/wallissoncarvalho/hydrobr/master/hydrobr/'
-                                        'resources/ANAF_flow_stations.csv')
-            list_stations.Code = list_stations.Code.apply(lambda x: f'{int(x):08}')
-            if city != '':
-                list_stations = list_stations[list_stations['City'] == city]
-            if state != '':
-                list_stations = list_stations[list_stations['State'] == state]
-
+            list_stations = Inventory.lookup('flow', state=state, city=city)
         else:
             raise Exception('Please, select a valid source.')
 
@@ -130,7 +150,7 @@ class ANA:
         source: string, default 'ANA'
             The source to look for the data. 'ANA' to get the list of stations from the Brazilian National Water Agency
             (ANA) database, or 'ANAF' to get the filtered list of stations that contain only the stations from ANA
-            with registered data.
+            with registered data, which is shipped with hydrobr, see hydrobr.Inventory.
             More information about ANAF: https://doi.org/10.5281/zenodo.3755065
         Returns
         -------
@@ -143,13 +163,7 @@ class ANA:
                       'telemetrica': ''}
             list_stations = ANA.__list_ana(params)
         elif source == 'ANAF':
-            list_stations = pd.read_csv('http://raw.githubusercontent.com/wallissoncarvalho/hydrobr/master/hydrobr/'
-                                        'resources/ANAF_prec_stations.csv')
-            list_stations.Code = list_stations.Code.apply(lambda x: f'{int(x):08}')
-            if city != '':
-                list_stations = list_stations[list_stations['City'] == city]
-            if state != '':
-                list_stations = list_stations[list_stations['State'] == state]
+            list_stations = Inventory.lookup('prec', state=state, city=city)
         else:
             raise Exception('Please, select a valid source.')
 
@@ -171,86 +185,138 @@ class ANA:
         return list_stations
 
     @staticmethod
-    def __data_ana(list_station, data_type, only_consisted, threads=10):
+    def __serie_historica(months, tag_format, only_consisted):
+        # One pass over the SerieHistorica elements: each month fills a row of a preallocated (months x 31) values
+        # array, grown by doubling while streaming, then the daily series is built with a single index construction.
+        day_tags = {tag_format.format(i + 1): i for i in range(31)}
+        values = np.full((1024, 31), np.nan)
+        consist = np.empty(1024, dtype=np.int64)
+        month_dates = []
+        code = None
+        for k, month in enumerate(months):
+            if k == len(consist):
+                values = np.concatenate([values, np.full(values.shape, np.nan)])
+                consist = np.concatenate([consist, np.empty(len(consist), dtype=np.int64)])
+            if code is None:
+                code = f"{int(month.find('EstacaoCodigo').text):08}"
+            consist[k] = int(month.find('NivelConsistencia').text)
+            month_dates.append(month.find('DataHora').text)
+            row = values[k]
+            for element in month:
+                day = day_tags.get(element.tag)
+                if day is not None and element.text is not None:
+                    row[day] = float(element.text)
+        if code is None:
+            return pd.DataFrame()
+        values, consist = values[:len(month_dates)], consist[:len(month_dates)]
+
+        # Day offsets of every (month, day) cell, keeping only the days that exist in each month
+        month_start = pd.to_datetime(month_dates, dayfirst=False).values.astype('datetime64[M]')
+        month_length = ((month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(int)
+        valid = np.arange(31) < month_length[:, None]
+        days = (month_start.astype('datetime64[D]').astype(np.int64)[:, None] + np.arange(31))[valid]
+        consist = np.broadcast_to(consist[:, None], valid.shape)[valid]
+        values = values[valid]
+
+        # Duplicated dates are resolved keeping the highest consistency level, or only the consisted data
+        if only_consisted:
+            consisted = consist == 2
+            if not consisted.any():
+                return pd.DataFrame()
+            days, consist, values = days[consisted], consist[consisted], values[consisted]
+        order = np.lexsort((consist, days))
+        days, values = days[order], values[order]
+        last = np.append(days[1:] != days[:-1], True)
+        days, values = days[last], values[last]
+
+        data = np.full(days[-1] - days[0] + 1, np.nan)
+        data[days - days[0]] = values
+        start = days[0].astype('datetime64[D]').item()
+        date_index = pd.date_range(pd.Timestamp(start.year, start.month, start.day), periods=len(data), freq='D')
+        return pd.Series(data, index=date_index, name=code)
+
+    @staticmethod
+    def __data_ana(list_station, data_type, only_consisted, threads=10, update=None, engine='threads',
+                   compact=False):
         if type(list_station) is not list:
             list_station = [list_station]
         data_types = {'3': ['Vazao{:02}'], '2': ['Chuva{:02}'], '1': ['Cota{:02}']}
-
-        def __call_request(station):
-            params = {'codEstacao': str(station), 'dataInicio': '', 'dataFim': '', 'tipoDados': data_type, 'nivelConsistencia': ''}
-            try:
-                response = requests.get('http://telemetriaws1.ana.gov.br/ServiceANA.asmx/HidroSerieHistorica', params,
-                                        timeout=120.0)
-            except (
-                    requests.ConnectTimeout, requests.HTTPError, requests.ReadTimeout, requests.Timeout,
-                    requests.ConnectionError):
-                return pd.DataFrame()
-            except http.client.IncompleteRead:
-                try:
-                    response = requests.get('http://telemetriaws1.ana.gov.br/ServiceANA.asmx/HidroSerieHistorica',
-                                            params,
-                                            timeout=120.0)
-                except:
-                    print('It was not possible to get the station {} data'.format(station))
-                    return pd.DataFrame()
-            except:
+        url = 'http://telemetriaws1.ana.gov.br/ServiceANA.asmx/HidroSerieHistorica'
+        # The requests of an update are cached only for a short time, so a frequent update gets the new data
+        source = 'ANA' if update is None else 'ANA-update'
+
+        def __stored(station):
+            # The stored data of the station in the update DataFrame, if there is any valid data
+            code = f'{int(station):08}'
+            if update is None or code not in update.columns or update[code].last_valid_index() is None:
+                return None
+            return update[code]
+
+        def __params(station):
+            # With an update DataFrame, only the data from the month of the last stored date on is requested, since
+            # that month may be incomplete
+            stored = __stored(station)
+            start = '' if stored is None else stored.last_valid_index().strftime('01/%m/%Y')
+            return {'codEstacao': str(station), 'dataInicio': start, 'dataFim': '', 'tipoDados': data_type,
+                    'nivelConsistencia': ''}
+
+        def __parse(station, source):
+            # The source is None when the request failed
+            series = pd.DataFrame()
+            if source is None:
                 print('It was not possible to get the station {} data'.format(station))
-                return pd.DataFrame()
-            try:
-                tree = ET.ElementTree(ET.fromstring(response.content))
-                root = tree.getroot()
-            except:
-                return pd.DataFrame()
-
-            df = []
-            for month in root.iter('SerieHistorica'):
-                code = month.find('EstacaoCodigo').text
-                code = f'{int(code):08}'
-                consist = int(month.find('NivelConsistencia').text)
-                date = pd.to_datetime(month.find('DataHora').text, dayfirst=False)
-                date = pd.Timestamp(date.year, date.month, 1, 0)
-                last_day = calendar.monthrange(date.year, date.month)[1]
-                month_dates = pd.date_range(date, periods=last_day, freq='D')
-                data = []
-                list_consist = []
-                for i in range(last_day):
-                    value = data_types[params['tipoDados']][0].format(i + 1)
-                    try:
-                        data.append(float(month.find(value).text))
-                        list_consist.append(consist)
-                    except TypeError:
-                        data.append(month.find(value).text)
-                        list_consist.append(consist)
-                    except AttributeError:
-                        data.append(None)
-                        list_consist.append(consist)
-                index_multi = list(zip(month_dates, list_consist))
-                index_multi = pd.MultiIndex.from_tuples(index_multi, names=["Date", "Consistence"])
-                df.append(pd.DataFrame({code: data}, index=index_multi))
-            if (len(df)) == 0:
-                return pd.DataFrame()
-            df = pd.concat(df)
-            df = df.sort_index()
-            if not only_consisted:
-                drop_index = df.reset_index(level=1, drop=True).index.duplicated(keep='last')
-                df = df[~drop_index]
-                df = df.reset_index(level=1, drop=True)
             else:
-                df = df[df.index.get_level_values(1) == 2]
-                df = df.reset_index(level=1, drop=True)
-                if (len(df)) == 0:
-                    return pd.DataFrame()
-            series = df[code]
+                try:
+                    series = ANA.__serie_historica(ANA.__iter_xml(source, 'SerieHistorica'),
+                                                   data_types[data_type][0], only_consisted)
+                except ET.ParseError:
+                    pass
+            # The stored data is replaced from the first requested date on
+            stored = __stored(station)
+            if stored is None:
+                return series
+            if series.empty:
+                return stored.loc[:stored.last_valid_index()]
+            series = pd.concat([stored.loc[:series.index[0] - pd.Timedelta(days=1)], series])
             date_index = pd.date_range(series.index[0], series.index[-1], freq='D')
-            series = series.reindex(date_index)
-            return series
-
-        if len(list_station) < threads:
-            threads = len(list_station)
+            return series.reindex(date_index)
 
-        with ThreadPool(threads) as pool:
-            responses = list(tqdm(pool.imap(__call_request, list_station), total=len(list_station)))
+        def __call_request(station):
+            params = __params(station)
+            # The request is retried by the session, and a response broken while it is read is requested once more
+            for attempt in range(2):
+                try:
+                    response = Cache.request(url, params, source=source, stream=True)
+                except requests.RequestException:
+                    break
+                if response.status_code != 200:
+                    response.close()
+                    break
+                try:
+                    return __parse(station, response.raw)
+                except (http.client.IncompleteRead, urllib3.exceptions.ProtocolError, requests.RequestException):
+                    continue
+                finally:
+                    response.close()
+            return __parse(station, None)
+
+        if engine == 'async':
+            # Each body is parsed as soon as it arrives, so only the series of the stations are kept
+            responses = AsyncEngine(threads).get([(url, __params(station)) for station in list_station], source,
+                                                 lambda i, content: __parse(list_station[i], io.BytesIO(content)))
+            responses = [__parse(station, None) if response is None else response
+                         for station, response in zip(list_station, responses)]
+        elif engine == 'threads':
+            if len(list_station) < threads:
+                threads = len(list_station)
+            Session.resize(threads)
+            with ThreadPool(threads) as pool:
+                responses = list(tqdm(pool.imap(__call_request, list_station), total=len(list_station)))
+        else:
+            raise Exception('Please, select a valid engine.')
         responses = [response for response in responses if not response.empty]
+        if compact:
+            return CompactFrame.from_series(responses)
         data_stations = pd.concat(responses, axis=1)
         date_index = pd.date_range(data_stations.index[0], data_stations.index[-1], freq='D')
         data_stations = data_stations.reindex(date_index)
@@ -269,7 +335,7 @@ class ANA:
         raise DeprecationWarning('The method name have changed. Use flow() instead of flow_data()')
 
     @staticmethod
-    def prec(list_station, only_consisted=False, threads=10):
+    def prec(list_station, only_consisted=False, threads=10, update=None, engine='threads', compact=False):
         """
         Get the precipitation station data series from a list of stations code.
         Parameters
@@ -280,18 +346,28 @@ class ANA:
             If True, returns only the data classified as consistent by the provider.
         threads: int
             Number of parallel requisitions
+        update : pandas DataFrame or hydrobr.CompactFrame, default None
+            A DataFrame previously returned by this method. If given, only the data from the month of the last stored
+            date of each station on is requested, and it is merged into the stored data.
+        engine : string, default 'threads'
+            'threads' to make the requests with a pool of threads, or 'async' to make them with asyncio over a single
+            pooled connection, which scales to many more concurrent requests. The 'async' engine requires aiohttp.
+        compact : boolean, default False
+            If True, returns a hydrobr.CompactFrame, which keeps each station only from its first to its last date in
+            float32, instead of the wide DataFrame.
         Returns
         -------
-        data_stations : pandas DataFrame
+        data_stations : pandas DataFrame or hydrobr.CompactFrame
             The data of each station as a column in a pandas DataFrame
         """
 
-        data_stations = ANA.__data_ana(list_station, '2', only_consisted=only_consisted, threads=threads)
+        data_stations = ANA.__data_ana(list_station, '2', only_consisted=only_consisted, threads=threads,
+                                       update=update, engine=engine, compact=compact)
 
         return data_stations
 
     @staticmethod
-    def stage(list_station, only_consisted=False, threads=10):
+    def stage(list_station, only_consisted=False, threads=10, update=None, engine='threads', compact=False):
         """
         Get the stage station data series from a list of stations code of the Brazilian National Water Agency
         (ANA) database.
@@ -303,17 +379,27 @@ class ANA:
             If True, returns only the data classified as consistent by the provider.
         threads: int
             Number of parallel requisitions
+        update : pandas DataFrame or hydrobr.CompactFrame, default None
+            A DataFrame previously returned by this method. If given, only the data from the month of the last stored
+            date of each station on is requested, and it is merged into the stored data.
+        engine : string, default 'threads'
+            'threads' to make the requests with a pool of threads, or 'async' to make them with asyncio over a single
+            pooled connection, which scales to many more concurrent requests. The 'async' engine requires aiohttp.
+        compact : boolean, default False
+            If True, returns a hydrobr.CompactFrame, which keeps each station only from its first to its last date in
+            float32, instead of the wide DataFrame.
         Returns
         -------
-        data_stations : pandas DataFrame
+        data_stations : pandas DataFrame or hydrobr.CompactFrame
             The data of each station as a column in a pandas DataFrame
         """
 
-        data_stations = ANA.__data_ana(list_station, '1', only_consisted=only_consisted, threads=threads)
+        data_stations = ANA.__data_ana(list_station, '1', only_consisted=only_consisted, threads=threads,
+                                       update=update, engine=engine, compact=compact)
         return data_stations
 
     @staticmethod
-    def flow(list_station, only_consisted=False, threads=10):
+    def flow(list_station, only_consisted=False, threads=10, update=None, engine='threads', compact=False):
         """
         Get the flow station data series from a list of stations code of the Brazilian National Water Agency
         (ANA) database.
@@ -325,16 +411,75 @@ class ANA:
             If True, returns only the data classified as consistent by the provider.
         threads: int
             Number of parallel requisitions
+        update : pandas DataFrame or hydrobr.CompactFrame, default None
+            A DataFrame previously returned by this method. If given, only the data from the month of the last stored
+            date of each station on is requested, and it is merged into the stored data.
+        engine : string, default 'threads'
+            'threads' to make the requests with a pool of threads, or 'async' to make them with asyncio over a single
+            pooled connection, which scales to many more concurrent requests. The 'async' engine requires aiohttp.
+        compact : boolean, default False
+            If True, returns a hydrobr.CompactFrame, which keeps each station only from its first to its last date in
+            float32, instead of the wide DataFrame.
         Returns
         -------
-        data_stations : pandas DataFrame
+        data_stations : pandas DataFrame or hydrobr.CompactFrame
             The data os each station as a column in a pandas DataFrame
         """
-        data_stations = ANA.__data_ana(list_station, '3', only_consisted=only_consisted, threads=threads)
+        data_stations = ANA.__data_ana(list_station, '3', only_consisted=only_consisted, threads=threads,
+                                       update=update, engine=engine, compact=compact)
         return data_stations
 
     @staticmethod
-    def telemetric(station_code, threads=10):
+    def __telemetric_request(station_code, date):
+        # The url and the parameters of the request of a date window of a telemetric station
+        return 'http://telemetriaws1.ana.gov.br/ServiceANA.asmx/DadosHidrometeorologicos', \
+            {'codEstacao': str(station_code), 'dataInicio': date[0].strftime("%d-%m-%Y"),
+             'dataFim': date[1].strftime("%d-%m-%Y")}
+
+    @staticmethod
+    def __telemetric_parse(source):
+        # The fields are collected as raw strings, column by column, and converted at once. The empty fields become NaN
+        fields = {'DataHora': [], 'Chuva': [], 'Nivel': [], 'Vazao': []}
+        try:
+            for data in ANA.__iter_xml(source, 'DadosHidrometereologicos'):
+                for field, values in fields.items():
+                    values.append(data.findtext(field))
+        except ET.ParseError:
+            return pd.DataFrame()
+        date = pd.to_datetime(fields['DataHora'], format="%Y-%m-%d %H:%M:%S")
+        return pd.DataFrame({column: pd.to_numeric(pd.Series(fields[field], dtype=object), errors='coerce').values
+                             for column, field in [('Precipitation', 'Chuva'), ('Stage', 'Nivel'), ('Flow', 'Vazao')]},
+                            index=date, dtype=float)
+
+    @staticmethod
+    def __telemetric_call(station_code):
+        # Returns the function that requests a date window of a telemetric station, and returns WindowPlanner.TIMEOUT
+        # if the request timed out, so the window is split, or None if it failed otherwise
+        def call_request(date):
+            url, params = ANA.__telemetric_request(station_code, date)
+            try:
+                response = Cache.request(url, params, source='ANA-telemetric', stream=True, retry_timeouts=False)
+            except requests.ConnectTimeout:
+                return None
+            except requests.Timeout:
+                return WindowPlanner.TIMEOUT
+            except requests.RequestException:
+                return None
+            try:
+                if response.status_code == 504:
+                    return WindowPlanner.TIMEOUT
+                if response.status_code != 200:
+                    return None
+                return ANA.__telemetric_parse(response.raw)
+            except urllib3.exceptions.ReadTimeoutError:
+                return WindowPlanner.TIMEOUT
+            finally:
+                response.close()
+
+        return call_request
+
+    @staticmethod
+    def telemetric(station_code, threads=10, engine='threads', start_date=None):
         """
         Get the Precipitation, Stage and Flow data for the ANA's telemetric stations as a DataFrame.
         Parameters
@@ -343,6 +488,12 @@ class ANA:
             The station code a string.
         threads: int
             Number of parallel requisitions
+        engine : string, default 'threads'
+            'threads' to make the requests with a pool of threads, or 'async' to make them with asyncio over a single
+            pooled connection, which scales to many more concurrent requests. The 'async' engine requires aiohttp.
+        start_date : int, float, str, default None
+            The date the station started operating, from which the data is requested. If None, the data is requested
+            from 1950 on, and the years without data are skipped by growing the requested date windows.
         Returns
         -------
         data_station : pandas DataFrame
@@ -351,46 +502,13 @@ class ANA:
 
         if type(station_code) is not str:
             raise Exception('This function only returns data for a single station at a time. The station_code must be '
-                            'a string.')
-        # Defining dates
-        start = pd.to_datetime('01/01/1950').strftime("%Y-%m-%d")
-        start_dates = pd.date_range(start=start, end=pd.to_datetime("today"), freq='180D').to_list()
-        if start_dates[0].strftime("%Y-%m-%d") != start:
-            start_dates.insert(0, pd.to_datetime(start))
-        end_dates = []
-        for i in range(len(start_dates) - 1):
-            end_dates.append(start_dates[i + 1] + datetime.timedelta(days=-1))
-        end_dates.append(pd.to_datetime("today"))
-
-        def __call_request(date):
-            params = {'codEstacao': str(station_code), 'dataInicio': date[0].strftime("%d-%m-%Y"),
-                      'dataFim': date[1].strftime("%d-%m-%Y")}
-            try:
-                response = requests.get('http://telemetriaws1.ana.gov.br/ServiceANA.asmx/DadosHidrometeorologicos',
-                                        params, timeout=120.0)
-            except:
-                raise Exception('It was not possible to get the data, please verify your connection and try again.')
-
-            try:
-                tree = ET.ElementTree(ET.fromstring(response.content))
-                root = tree.getroot()
-            except:
-                return pd.DataFrame()
-            date, prec, stage, flow = [], [], [], []
-            for data in root.iter('DadosHidrometereologicos'):
-                date.append(pd.to_datetime(data.find('DataHora').text, format="%Y-%m-%d %H:%M:%S"))
-                prec.append(data.find('Chuva').text)
-                stage.append(data.find('Nivel').text)
-                flow.append(data.find('Vazao').text)
-            df = pd.DataFrame({'Precipitation': prec, 'Stage': stage, 'Flow': flow}, index=date)
-            df.Precipitation = df.Precipitation.astype(float)
-            df.Stage = df.Stage.astype(float)
-            df.Flow = df.Flow.astype(float)
-            return df
-
-        iteration = [(start_date, end_date) for start_date, end_date in zip(start_dates, end_dates)]
-        with ThreadPool(threads) as pool:
-            responses = list(tqdm(pool.imap(__call_request, iteration), total=len(iteration)))
+                            'a string. Use ANA.telemetric_batch for many stations.')
+        # The windows requested start at 180 days and adapt to the responses
+        start = pd.to_datetime('01/01/1950') if start_date is None else pd.to_datetime(start_date)
+        planner = WindowPlanner(start, pd.to_datetime("today"), size=180, threshold=20000, wave=threads)
+        responses = planner.run(ANA.__telemetric_call(station_code),
+                                lambda date: ANA.__telemetric_request(station_code, date),
+                                lambda content: ANA.__telemetric_parse(io.BytesIO(content)), 'ANA-telemetric', engine)
         responses = [response for response in responses if not response.empty]
         if len(responses) == 0:
             warnings.warn('There is no data available for this stations')
@@ -399,49 +517,238 @@ class ANA:
         data_station = data_station.sort_index()
         return data_station
 
-class INMET:
-    """
-    It provides a connection with the  Brazilian National Institute of Meteorology (Instituto Nacional de Meteorologia
-     - INMET) database.
-    """
-
     @staticmethod
-    def list_stations(station_type='both'):
+    def telemetric_batch(station_codes, threads=10, engine='threads', start_date=None, update=None):
         """
-        Searches for precipitation stations registered at the Brazilian National Agency of Water (ANA) or the INMET
-        inventory.
+        Get the Precipitation, Stage and Flow data for many ANA's telemetric stations as a single DataFrame.
 
+        The date windows of all the stations are requested on a single pool of threads, so at most `threads` requests
+        are in flight whatever the number of stations.
         Parameters
         ----------
-        station_type : string, default 'both'
-            The type of station. 'both' to get the list of automatic and manual gauge stations, 'automatic' to get only
-            the automatic gauge stations, and 'conventional' to get only the conventional gauge stations.
+        station_codes : list of strings
+            The codes of the stations.
+        threads: int
+            Number of parallel requisitions, shared by all the stations.
+        engine : string, default 'threads'
+            'threads' to make the requests with a pool of threads, or 'async' to make them with asyncio over a single
+            pooled connection, which scales to many more concurrent requests. The 'async' engine requires aiohttp.
+        start_date : int, float, str, default None
+            The date from which the data is requested, see ANA.telemetric.
+        update : pandas DataFrame, default None
+            A DataFrame previously returned by this method. If given, only the data from the day of the last stored
+            timestamp of each station on is requested, since that day may be incomplete, and it is merged into the
+            stored data.
         Returns
         -------
-        list_stations : pandas DataFrame
-            The selected list of stations as a pandas DataFrame
+        data_stations : pandas DataFrame
+            The data of the stations indexed by Station and Date.
         """
+        if type(station_codes) is not list:
+            station_codes = [station_codes]
+        station_codes = [str(station_code) for station_code in station_codes]
+        last_dates = pd.Series(dtype=object)
+        if update is not None and not update.empty:
+            last_dates = pd.Series(update.index.get_level_values('Date')).groupby(
+                update.index.get_level_values('Station')).max()
+
+        start = pd.to_datetime('01/01/1950') if start_date is None else pd.to_datetime(start_date)
+        starts, jobs = {}, []
+        for station_code in station_codes:
+            starts[station_code] = last_dates[station_code].normalize() if station_code in last_dates.index else start
+            planner = WindowPlanner(starts[station_code], pd.to_datetime("today"), size=180, threshold=20000,
+                                    wave=min(threads, 4))
+            jobs.append((station_code, planner, ANA.__telemetric_call(station_code),
+                         lambda date, code=station_code: ANA.__telemetric_request(code, date),
+                         lambda content: ANA.__telemetric_parse(io.BytesIO(content))))
+
+        data_stations = {}
+        for station_code, responses in WindowScheduler(threads, engine).run(jobs, 'ANA-telemetric'):
+            if responses is None:
+                print('It was not possible to get the station {} data'.format(station_code))
+                responses = []
+            responses = [response for response in responses if not response.empty]
+            # The stored data is replaced from the first requested day on
+            if station_code in last_dates.index:
+                stored = update.loc[station_code]
+                responses = [stored[stored.index < starts[station_code]]] + responses
+            if responses:
+                data_stations[station_code] = pd.concat(responses).sort_index()
+
+        if len(data_stations) == 0:
+            warnings.warn('There is no data available for this stations')
+            return pd.DataFrame()
+        return pd.concat({station_code: data_stations[station_code] for station_code in station_codes
+                          if station_code in data_stations}, names=['Station', 'Date'])
+
 
+class INMET:
+    """
+    It provides a connection with the  Brazilian National Institute of Meteorology (Instituto Nacional de Meteorologia
+     - INMET) database.
+    """
+
+    # Time in seconds the list of stations is kept in memory
+    stations_ttl = 86400
+
+    _stations = {}
+    _stations_lock = threading.Lock()
+
+    @staticmethod
+    def __call_request(url):
+        # Returns the function that requests a date window of a station, and returns WindowPlanner.TIMEOUT if the
+        # request timed out, so the window is split, or None if it failed otherwise
+        def call_request(date):
+            try:
+                response = Cache.request(url(date), source='INMET', retry_timeouts=False)
+                if response.status_code == 504:
+                    return WindowPlanner.TIMEOUT
+                if response.status_code != 200:
+                    return None
+                return pd.DataFrame(json.loads(response.text))
+            except requests.ConnectTimeout:
+                return None
+            except requests.Timeout:
+                return WindowPlanner.TIMEOUT
+            except (requests.RequestException, ValueError):
+                return None
+
+        return call_request
+
+    @staticmethod
+    def __planner(start, threshold, wave):
+        # The data of a station is requested from its start of operation on, in date windows that start at 60 days
+        # and adapt to the responses
+        return WindowPlanner(start, pd.to_datetime("today"), size=60, threshold=threshold, max_size=365, wave=wave)
+
+    @staticmethod
+    def __get(url, start, threshold, threads, engine):
+        planner = INMET.__planner(start, threshold, threads)
+        return planner.run(INMET.__call_request(url), lambda date: (url(date), None),
+                           lambda content: pd.DataFrame(json.loads(content)), 'INMET', engine)
+
+    @staticmethod
+    def __batch(station_codes, station_type, url, threshold, frame, threads, engine):
+        # Generator of the (code, data) of the stations, in the order they finish. Each station requests up to 4
+        # windows at a time, so the pool is shared by several stations
+        if type(station_codes) is str:
+            station_codes = [station_codes]
+        stations = INMET.stations_metadata(list(station_codes), station_type)
+        jobs = []
+        for station_code, start in zip(stations['Code'], stations['Start Operation']):
+            station_url = url(station_code)
+            jobs.append((station_code, INMET.__planner(start, threshold, min(threads, 4)),
+                         INMET.__call_request(station_url), lambda date, url=station_url: (url(date), None),
+                         lambda content: pd.DataFrame(json.loads(content))))
+        for station_code, responses in WindowScheduler(threads, engine).run(jobs, 'INMET'):
+            try:
+                data_station = frame(responses)
+            except (TypeError, ValueError, KeyError, IndexError):
+                data_station = None
+            if data_station is None:
+                print('It was not possible to get the station {} data'.format(station_code))
+                continue
+            yield station_code, data_station
+
+    @staticmethod
+    def __collect(stations, layout):
+        if layout == 'stream':
+            return stations
+        data = dict(stations)
+        if layout == 'dict':
+            return data
+        if not data:
+            return pd.DataFrame()
+        return pd.concat(data, names=['Station', 'Date'])
+
+    @staticmethod
+    def __daily_url(station_code):
+        def url(date):
+            return 'https://apitempo.inmet.gov.br/estacao/diaria/{}/{}/{}'.format(date[0].strftime("%Y-%m-%d"),
+                                                                                  date[1].strftime("%Y-%m-%d"),
+                                                                                  station_code)
+
+        return url
+
+    @staticmethod
+    def __hourly_url(station_code):
+        def url(date):
+            return 'https://apitempo.inmet.gov.br/estacao/{}/{}/{}'.format(date[0].strftime("%Y-%m-%d"),
+                                                                           date[1].strftime("%Y-%m-%d"),
+                                                                           station_code)
+
+        return url
+
+    @staticmethod
+    def __daily_frame(responses, filter):
+        data_station = pd.concat(responses)
+        data_station.rename(
+            columns={'CHUVA': 'Prec', 'TEMP_MAX': 'Tmax', 'TEMP_MED': 'Tmean', 'TEMP_MIN': 'Tmin', 'UMID_MED': 'RHmean',
+                     'UMID_MIN': 'RHmin', 'UMID_MAX': 'RHmax', 'INSOLACAO': 'SD', 'DT_MEDICAO': 'Date'}, inplace=True)
+        data_station.index = pd.to_datetime(data_station.Date)
+        data_station.drop(['UF', 'Date', 'DC_NOME', 'CD_ESTACAO', 'VL_LATITUDE', 'VL_LONGITUDE'], axis=1, inplace=True)
+        data_station = data_station[sorted(data_station.columns)]
+        data_station[data_station.columns] = data_station[data_station.columns].apply(pd.to_numeric, errors='coerce')
+        data_station = data_station.dropna(how='all', axis=0)
+        if filter:
+            data_station = data_station.reset_index().drop_duplicates(subset='Date', keep='first').set_index('Date')
+            date_index = pd.date_range(data_station.index[0], data_station.index[-1], freq='D')
+            data_station = data_station.reindex(date_index)
+        data_station = data_station.convert_dtypes()
+        data_station = data_station.astype(float)
+        data_station.index = pd.to_datetime(data_station.index)
+        return data_station
+
+    @staticmethod
+    def __hourly_frame(responses):
+        data_station = pd.concat(responses)
+        data_station['Date'] = pd.to_datetime(
+            data_station['DT_MEDICAO'] + data_station['HR_MEDICAO'].apply(lambda x: ' ' + x[:2]))
+        data_station.index = data_station['Date']
+        data_station.rename(columns={'CHUVA': 'Prec', 'TEM_MAX': 'Tmax', 'TEM_INS': 'Tins', 'TEM_MIN': 'Tmin',
+                                     'PRE_INS': 'Pins', 'PRE_MAX': 'Pmax', 'PRE_MIN': 'Pmin', 'PTO_INS': 'DPins',
+                                     'PTO_MAX': 'DPmax',
+                                     'PTO_MIN': 'DPmin', 'UMD_INS': 'RHins', 'UMD_MAX': 'RHmax', 'UMD_MIN': 'RHmin',
+                                     'VEN_DIR': 'Wdir',
+                                     'VEN_RAJ': 'Wgust', 'VEN_VEL': 'Wspeed', 'RAD_GLO': 'Rad'}, inplace=True)
+        data_station = data_station[
+            ['Tins', 'Tmax', 'Tmin', 'RHins', 'RHmax', 'RHmin', 'DPins', 'DPmax', 'DPmin', 'Pins', 'Pmax', 'Pmin',
+             'Wspeed', 'Wdir', 'Wgust', 'Rad', 'Prec']]
+
+        # Cleaning the data
+        data_station = data_station.dropna(how='all', axis=0)
+        data_station = data_station.reset_index().drop_duplicates(subset='Date', keep='first').set_index('Date')
+        date_index = pd.date_range(data_station.index[0], data_station.index[-1], freq='H')
+        data_station = data_station.reindex(date_index)
+        data_station = data_station.sort_index()
+        data_station = data_station.convert_dtypes()
+        data_station = data_station.astype(float)
+        data_station.index = pd.to_datetime(data_station.index)
+        return data_station
+
+    @staticmethod
+    def __list_stations(station_type):
         if station_type == 'both':
-            responseM = requests.get('https://apitempo.inmet.gov.br/estacoes/M', timeout=120.0)
-            responseT = requests.get('https://apitempo.inmet.gov.br/estacoes/T', timeout=120.0)
+            responseM = Cache.request('https://apitempo.inmet.gov.br/estacoes/M', source='INMET')
+            responseT = Cache.request('https://apitempo.inmet.gov.br/estacoes/T', source='INMET')
             list_stations = pd.concat([pd.DataFrame(json.loads(responseM.text)),
                                        pd.DataFrame(json.loads(responseT.text))])
         elif station_type == 'automatic':
-            response = requests.get('https://apitempo.inmet.gov.br/estacoes/T', timeout=120.0)
+            response = Cache.request('https://apitempo.inmet.gov.br/estacoes/T', source='INMET')
             list_stations = pd.DataFrame(json.loads(response.text))
         elif station_type == 'conventional':
-            response = requests.get('https://apitempo.inmet.gov.br/estacoes/M', timeout=120.0)
+            response = Cache.request('https://apitempo.inmet.gov.br/estacoes/M', source='INMET')
             list_stations = pd.DataFrame(json.loads(response.text))
         else:
             raise Exception('Please, select a valid station type.')
 
-        list_stations['TP_ESTACAO'].replace({'Automatica': 'Automatic', 'Convencional': 'Conventional'}, inplace=True)
-        list_stations.rename(columns={'CD_ESTACAO': 'Code', 'TP_ESTACAO': 'Type', 'DC_NOME': 'Name',
-                                      'SG_ESTADO': 'State', 'VL_LATITUDE': 'Latitude', 'VL_LONGITUDE': 'Longitude',
-                                      'VL_ALTITUDE': 'Height', 'DT_INICIO_OPERACAO': 'Start Operation',
-                                      'DT_FIM_OPERACAO': 'End Operation'},
-                             inplace=True)
+        list_stations['TP_ESTACAO'] = list_stations['TP_ESTACAO'].replace({'Automatica': 'Automatic',
+                                                                           'Convencional': 'Conventional'})
+        list_stations = list_stations.rename(columns={'CD_ESTACAO': 'Code', 'TP_ESTACAO': 'Type', 'DC_NOME': 'Name',
+                                                      'SG_ESTADO': 'State', 'VL_LATITUDE': 'Latitude',
+                                                      'VL_LONGITUDE': 'Longitude', 'VL_ALTITUDE': 'Height',
+                                                      'DT_INICIO_OPERACAO': 'Start Operation',
+                                                      'DT_FIM_OPERACAO': 'End Operation'})
         list_stations = list_stations[
             ['Code', 'Type', 'Name', 'State', 'Latitude', 'Longitude', 'Height', 'Start Operation', 'End Operation']]
         list_stations['Start Operation'] = pd.to_datetime(list_stations['Start Operation'])
@@ -450,7 +757,71 @@ class INMET:
         return list_stations
 
     @staticmethod
-    def daily_data(station_code, filter=True, threads=10):
+    def list_stations(station_type='both', refresh=False):
+        """
+        Searches for precipitation stations registered at the Brazilian National Agency of Water (ANA) or the INMET
+        inventory.
+
+        The list is kept in memory for INMET.stations_ttl seconds, so repeated calls do not request it again.
+
+        Parameters
+        ----------
+        station_type : string, default 'both'
+            The type of station. 'both' to get the list of automatic and manual gauge stations, 'automatic' to get only
+            the automatic gauge stations, and 'conventional' to get only the conventional gauge stations.
+        refresh : boolean, default False
+            If True, requests the list again even if it is kept in memory.
+        Returns
+        -------
+        list_stations : pandas DataFrame
+            The selected list of stations as a pandas DataFrame
+        """
+        with INMET._stations_lock:
+            stored = INMET._stations.get(station_type)
+            if refresh or stored is None or time.time() - stored[0] > INMET.stations_ttl:
+                list_stations = INMET.__list_stations(station_type)
+                codes = dict(zip(list_stations['Code'], range(len(list_stations))))
+                stored = INMET._stations[station_type] = (time.time(), list_stations, codes)
+        return stored[1].copy()
+
+    @staticmethod
+    def refresh_stations():
+        """
+        Discards the lists of stations kept in memory, so they are requested again on the next call.
+
+        Returns
+        -------
+        """
+        with INMET._stations_lock:
+            INMET._stations = {}
+
+    @staticmethod
+    def stations_metadata(station_codes, station_type='both'):
+        """
+        Looks up many stations at once in the list of stations kept in memory.
+
+        Parameters
+        ----------
+        station_codes : list of strings
+            The codes of the stations.
+        station_type : string, default 'both'
+            The type of station, see INMET.list_stations.
+        Returns
+        -------
+        stations : pandas DataFrame
+            The data of the stations from INMET.list_stations, in the order of station_codes.
+        """
+        if type(station_codes) is not list:
+            station_codes = [station_codes]
+        INMET.list_stations(station_type)
+        list_stations, codes = INMET._stations[station_type][1:]
+        invalid = [code for code in station_codes if code not in codes]
+        if invalid:
+            raise Exception('Please input valid station codes: {}'.format(', '.join(map(str, invalid))))
+        return list_stations.iloc[[codes[code] for code in station_codes]].copy()
+
+    @staticmethod
+    def daily_data(station_code, filter=True, threads=10, engine='threads'):
         """
         Searches for all the data of a station registered at the Brazilian National Institute of Meteorology
         (Instituto Nacional de Meteorologia - INMET) database.
@@ -473,65 +844,24 @@ class INMET:
             datetime index.
         threads: int
             Number of parallel requisitions
+        engine : string, default 'threads'
+            'threads' to make the requests with a pool of threads, or 'async' to make them with asyncio over a single
+            pooled connection, which scales to many more concurrent requests. The 'async' engine requires aiohttp.
 
         Returns
         -------
         data : pandas DataFrame
             The data of the selected station as a pandas DataFrame
         """
-        list_stations = INMET.list_stations()
-        station = list_stations[list_stations.Code == station_code]
-        if len(station) == 0:
-            raise Exception('Please input a valid station code')
-
-        # Defining dates
-        start = station['Start Operation'].to_list()[0].strftime("%Y-%m-%d")
-        start_dates = pd.date_range(start=start, end=pd.to_datetime("today"), freq='60D').to_list()
-        if start_dates[0].strftime("%Y-%m-%d") != start:
-            start_dates.insert(0, pd.to_datetime(start))
-        end_dates = []
-        for i in range(len(start_dates) - 1):
-            end_dates.append(start_dates[i + 1] + datetime.timedelta(days=-1))
-        end_dates.append(pd.to_datetime("today"))
-
-        def __call_request(date):
-            start_date = date[0]
-            end_date = date[1]
-            try:
-                response = requests.get('https://apitempo.inmet.gov.br/estacao/diaria/{}/{}/{}'.format(
-                    start_date.strftime("%Y-%m-%d"),
-                    end_date.strftime("%Y-%m-%d"),
-                    station_code),
-                    timeout=120.0)
-                response = pd.DataFrame(json.loads(response.text))
-            except:
-                raise Exception('It was not possible to get the data, please verify your connection and try again.')
-            return response
+        station = INMET.stations_metadata([station_code])
 
         # Getting the data
-        iteration = [(start_date, end_date) for start_date, end_date in zip(start_dates, end_dates)]
-        with ThreadPool(threads) as pool:
-            responses = list(tqdm(pool.imap(__call_request, iteration), total=len(iteration)))
-        data_station = pd.concat(responses)
-        data_station.rename(
-            columns={'CHUVA': 'Prec', 'TEMP_MAX': 'Tmax', 'TEMP_MED': 'Tmean', 'TEMP_MIN': 'Tmin', 'UMID_MED': 'RHmean',
-                     'UMID_MIN': 'RHmin', 'UMID_MAX': 'RHmax', 'INSOLACAO': 'SD', 'DT_MEDICAO': 'Date'}, inplace=True)
-        data_station.index = pd.to_datetime(data_station.Date)
-        data_station.drop(['UF', 'Date', 'DC_NOME', 'CD_ESTACAO', 'VL_LATITUDE', 'VL_LONGITUDE'], axis=1, inplace=True)
-        data_station = data_station[sorted(data_station.columns)]
-        data_station[data_station.columns] = data_station[data_station.columns].apply(pd.to_numeric, errors='coerce')
-        data_station = data_station.dropna(how='all', axis=0)
-        if filter:
-            data_station = data_station.reset_index().drop_duplicates(subset='Date', keep='first').set_index('Date')
-            date_index = pd.date_range(data_station.index[0], data_station.index[-1], freq='D')
-            data_station = data_station.reindex(date_index)
-        data_station = data_station.convert_dtypes()
-        data_station = data_station.astype(float)
-        data_station.index = pd.to_datetime(data_station.index)
-        return data_station
+        responses = INMET.__get(INMET.__daily_url(station_code), station['Start Operation'].to_list()[0], 1000,
+                                threads, engine)
+        return INMET.__daily_frame(responses, filter)
 
     @staticmethod
-    def hourly_data(station_code, threads=10):
+    def hourly_data(station_code, threads=10, engine='threads'):
         """
         Searches for all the data of a station registered at the Brazilian National Institute of Meteorology
         (Instituto Nacional de Meteorologia - INMET) database.
@@ -563,68 +893,88 @@ class INMET:
             Code of the station as a string.
         threads: int
             Number of parallel requisitions
+        engine : string, default 'threads'
+            'threads' to make the requests with a pool of threads, or 'async' to make them with asyncio over a single
+            pooled connection, which scales to many more concurrent requests. The 'async' engine requires aiohttp.
         Returns
         -------
         data : pandas DataFrame
             The data of the selected station as a pandas DataFrame.
         """
-        list_stations = INMET.list_stations(station_type='automatic')
-        station = list_stations[list_stations.Code == station_code]
-        if len(station) == 0:
-            raise Exception('Please input a valid station code')
-
-        # Defining dates
-        start = station['Start Operation'].to_list()[0].strftime("%Y-%m-%d")
-        start_dates = pd.date_range(start=start, end=pd.to_datetime("today"), freq='60D').to_list()
-        if start_dates[0].strftime("%Y-%m-%d") != start:
-            start_dates.insert(0, pd.to_datetime(start))
-        end_dates = []
-        for i in range(len(start_dates) - 1):
-            end_dates.append(start_dates[i + 1] + datetime.timedelta(days=-1))
-        end_dates.append(pd.to_datetime("today"))
-
-        def __call_request(date):
-            start_date = date[0]
-            end_date = date[1]
-            try:
-                response = requests.get(
-                    'https://apitempo.inmet.gov.br/estacao/{}/{}/{}'.format(start_date.strftime("%Y-%m-%d"),
-                                                                            end_date.strftime("%Y-%m-%d"),
-                                                                            station_code), timeout=120.0)
-                response = pd.DataFrame(json.loads(response.text))
-            except:
-                raise Exception('It was not possible to get the data, please verify your connection and try again.')
-            return response
+        station = INMET.stations_metadata([station_code], station_type='automatic')
 
         # Getting the data
-        iteration = [(start_date, end_date) for start_date, end_date in zip(start_dates, end_dates)]
-        with ThreadPool(threads) as pool:
-            responses = list(tqdm(pool.imap(__call_request, iteration), total=len(iteration)))
+        responses = INMET.__get(INMET.__hourly_url(station_code), station['Start Operation'].to_list()[0], 4000,
+                                threads, engine)
+        return INMET.__hourly_frame(responses)
 
-        data_station = pd.concat(responses)
-        data_station['Date'] = pd.to_datetime(
-            data_station['DT_MEDICAO'] + data_station['HR_MEDICAO'].apply(lambda x: ' ' + x[:2]))
-        data_station.index = data_station['Date']
-        data_station.rename(columns={'CHUVA': 'Prec', 'TEM_MAX': 'Tmax', 'TEM_INS': 'Tins', 'TEM_MIN': 'Tmin',
-                                     'PRE_INS': 'Pins', 'PRE_MAX': 'Pmax', 'PRE_MIN': 'Pmin', 'PTO_INS': 'DPins',
-                                     'PTO_MAX': 'DPmax',
-                                     'PTO_MIN': 'DPmin', 'UMD_INS': 'RHins', 'UMD_MAX': 'RHmax', 'UMD_MIN': 'RHmin',
-                                     'VEN_DIR': 'Wdir',
-                                     'VEN_RAJ': 'Wgust', 'VEN_VEL': 'Wspeed', 'RAD_GLO': 'Rad'}, inplace=True)
-        data_station = data_station[
-            ['Tins', 'Tmax', 'Tmin', 'RHins', 'RHmax', 'RHmin', 'DPins', 'DPmax', 'DPmin', 'Pins', 'Pmax', 'Pmin',
-             'Wspeed', 'Wdir', 'Wgust', 'Rad', 'Prec']]
+    @staticmethod
+    def daily_data_batch(station_codes, filter=True, threads=10, engine='threads', layout='dict'):
+        """
+        Searches for all the data of many stations registered at the Brazilian National Institute of Meteorology
+        (Instituto Nacional de Meteorologia - INMET) database, with the variables of INMET.daily_data.
 
-        # Cleaning the data
-        data_station = data_station.dropna(how='all', axis=0)
-        data_station = data_station.reset_index().drop_duplicates(subset='Date', keep='first').set_index('Date')
-        date_index = pd.date_range(data_station.index[0], data_station.index[-1], freq='H')
-        data_station = data_station.reindex(date_index)
-        data_station = data_station.sort_index()
-        data_station = data_station.convert_dtypes()
-        data_station = data_station.astype(float)
-        data_station.index = pd.to_datetime(data_station.index)
-        return data_station
+        The date windows of all the stations are requested on a single pool of threads, and the data of each station
+        is built as soon as all its windows are received, so the stations do not wait for each other.
+
+        Parameters
+        ----------
+        station_codes : list of strings
+            Codes of the stations.
+        filter: boolean, default True
+            See INMET.daily_data.
+        threads: int
+            Number of parallel requisitions, shared by all the stations.
+        engine : string, default 'threads'
+            See INMET.daily_data.
+        layout : string, default 'dict'
+            'dict' to return a dict of DataFrames by station code, 'long' to return a single DataFrame indexed by
+            Station and Date, or 'stream' to return a generator of (station code, DataFrame) in the order the
+            stations finish.
+
+        Returns
+        -------
+        data : dict, pandas DataFrame or generator
+            The data of the selected stations.
+        """
+        if layout not in ['dict', 'long', 'stream']:
+            raise Exception('Please, select a valid layout.')
+        stations = INMET.__batch(station_codes, 'both', INMET.__daily_url, 1000,
+                                 lambda responses: INMET.__daily_frame(responses, filter), threads, engine)
+        return INMET.__collect(stations, layout)
+
+    @staticmethod
+    def hourly_data_batch(station_codes, threads=10, engine='threads', layout='dict'):
+        """
+        Searches for all the hourly data of many automatic stations registered at the Brazilian National Institute of
+        Meteorology (Instituto Nacional de Meteorologia - INMET) database, with the variables of INMET.hourly_data.
+
+        The date windows of all the stations are requested on a single pool of threads, and the data of each station
+        is built as soon as all its windows are received, so the stations do not wait for each other.
+
+        Parameters
+        ----------
+        station_codes : list of strings
+            Codes of the stations.
+        threads: int
+            Number of parallel requisitions, shared by all the stations.
+        engine : string, default 'threads'
+            See INMET.hourly_data.
+        layout : string, default 'dict'
+            'dict' to return a dict of DataFrames by station code, 'long' to return a single DataFrame indexed by
+            Station and Date, or 'stream' to return a generator of (station code, DataFrame) in the order the
+            stations finish.
+
+        Returns
+        -------
+        data : dict, pandas DataFrame or generator
+            The data of the selected stations.
+        """
+        if layout not in ['dict', 'long', 'stream']:
+            raise Exception('Please, select a valid layout.')
+        stations = INMET.__batch(station_codes, 'automatic', INMET.__hourly_url, 4000, INMET.__hourly_frame, threads,
+                                 engine)
+        return INMET.__collect(stations, layout)
 
 
 class ONS:
@@ -646,8 +996,9 @@ class ONS:
         data : pandas DataFrame
             All the naturalized daily flow data as a pandas DataFrame, where each column refers to a specific reservoir.
         """
-        data = pd.read_csv('http://raw.githubusercontent.com/wallissoncarvalho/hydrobr/master/hydrobr/'
-                           'resources/ONS_daily_flow.csv')
+        response = Cache.request('http://raw.githubusercontent.com/wallissoncarvalho/hydrobr/master/hydrobr/'
+                                 'resources/ONS_daily_flow.csv', source='ONS')
+        data = pd.read_csv(io.BytesIO(response.content))
         data.index = pd.to_datetime(data.Date)
         data.drop('Date', axis=1, inplace=True)
         return data
@@ -4,10 +4,13 @@ import plotly.figure_factory as ff
 import plotly.graph_objects as go
 from math import ceil, log
 
+from hydrobr.preprocessing import PreProcessing
+
+
 class Plot:
 
     @staticmethod
-    def fdc(data, y_log_scale=True):
+    def fdc(data, y_log_scale=True, n_points=1000):
         """
         Make a flow duration curve plot.
 
@@ -17,22 +20,35 @@ class Plot:
             A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station..
         y_log_scale : boolean, default True
             Defines if the the plotting y-axis will be in the logarithmic scale.
+        n_points : int, default 1000
+            The maximum number of points of each curve. The curves of the stations with more valid data are evaluated
+            at n_points evenly spaced exceedance percentages by PreProcessing.fdc, and the curves of the other stations
+            are exact, with a point per data. If None, all the curves are exact.
 
         Returns
         -------
         fig : plotly Figure
         """
 
+        n = data.notna().sum().values
+        exact = np.ones(len(n), dtype=bool) if n_points is None else n <= n_points
+        if not exact.all():
+            grid = np.linspace(0, 100, n_points)
+            sampled = PreProcessing.fdc(data.iloc[:, np.flatnonzero(~exact)], grid).values
+            sampled_row = np.cumsum(~exact) - 1
+
         fig = go.Figure()
         y_max = 0
-        for name in data.columns:
-            series = data[name].dropna()
-            n = len(series)
-            y = np.sort(series)
-            y = y[::-1]
+        for i, name in enumerate(data.columns):
+            if n[i] == 0:
+                continue
+            if exact[i]:
+                y = np.sort(data.iloc[:, i].dropna().values)[::-1]
+                x = (np.arange(1, n[i] + 1) / n[i]) * 100
+            else:
+                x, y = grid, sampled[sampled_row[i]]
             if y_max < y.max():
                 y_max = y.max()
-            x = (np.arange(1, n + 1) / n) * 100
             fig.add_trace(go.Scatter(x=x, y=y, mode='lines', name=name))
 
         if y_log_scale:
@@ -44,7 +60,34 @@ class Plot:
         return fig
 
     @staticmethod
-    def gantt(data, monthly=True):
+    def __availability(data, monthly):
+        # The availability of each station on each day, or on each month if monthly, as a boolean array
+        date_index = pd.date_range(data.index[0], data.index[-1], freq='D')
+        missing = data.reindex(date_index).isnull().values
+        if not monthly:
+            return date_index, ~missing, pd.Timedelta(days=1)
+        months = date_index.year * 12 + date_index.month
+        first = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        dates = date_index[first].to_period('M').to_timestamp()
+        # A month without 7 data is considered a missing month
+        return dates, np.add.reduceat(missing, first, axis=0, dtype=np.int32) < 7, pd.DateOffset(months=1)
+
+    @staticmethod
+    def __periods(dates, available, columns):
+        # The periods of consecutive available days or months, found by the differences of the availability of all
+        # the stations at once. The stations with only one available day or month are ignored
+        ignored = available.sum(axis=0) <= 1
+        for column in columns[ignored]:
+            print('Station {} has no months with significant data'.format(column))
+        available = available[:, ~ignored]
+        changes = np.diff(available.astype(np.int8), axis=0, prepend=0, append=0).T
+        station, start = np.nonzero(changes == 1)
+        end = np.nonzero(changes == -1)[1] - 1
+        return pd.DataFrame({'Task': columns[~ignored][station], 'Start': dates[start], 'Finish': dates[end],
+                             'Resource': 'Available data'})
+
+    @staticmethod
+    def gantt(data, monthly=True, mode='gantt'):
         """
         Make a Gantt plot, which shows the temporal data availability for each station.
 
@@ -54,55 +97,48 @@ class Plot:
             A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station..
         monthly : boolean, default True
             Defines if the availability count of the data will be monthly to obtain a more fluid graph.
+        mode : string, default 'gantt'
+            'gantt' to draw a bar for each period of available data, 'traces' to draw the periods of each station as
+            a single WebGL trace, or 'heatmap' to draw the availability of all the stations as a single heatmap. The
+            'traces' and 'heatmap' modes keep the plot interactive for thousands of stations.
 
         Returns
         -------
         fig : plotly Figure
         """
 
-        date_index = pd.date_range(data.index[0], data.index[-1], freq='D')
-        data = data.reindex(date_index)
-        periods = []
-        for column in data.columns:
-            series = data[column]
-            if monthly:
-                missing = series.isnull().groupby(pd.Grouper(freq='1MS')).sum().to_frame()
-                series_drop = missing.loc[missing[column] < 7]  # A MONTH WITHOUT 7 DATA IS CONSIDERED A MISSING MONTH
-                DELTA = 'M'
-            else:
-                series_drop = series.dropna()
-                DELTA = 'D'
-            if series_drop.shape[0] > 1:
-                task = column
-                resource = 'Available data'
-                start = str(series_drop.index[0].year) + '-' + str(series_drop.index[0].month) + '-' + str(
-                    series_drop.index[0].day)
-                finish = 0
-                for i in range(len(series_drop)):
-                    if i != 0 and round((series_drop.index[i] - series_drop.index[i - 1]) / np.timedelta64(1, DELTA),
-                                        0) != 1:
-                        finish = str(series_drop.index[i - 1].year) + '-' + str(
-                            series_drop.index[i - 1].month) + '-' + str(
-                            series_drop.index[i - 1].day)
-                        periods.append(dict(Task=task, Start=start, Finish=finish, Resource=resource))
-                        start = str(series_drop.index[i].year) + '-' + str(series_drop.index[i].month) + '-' + str(
-                            series_drop.index[i].day)
-                        finish = 0
-                finish = str(series_drop.index[-1].year) + '-' + str(series_drop.index[-1].month) + '-' + str(
-                    series_drop.index[-1].day)
-                periods.append(dict(Task=task, Start=start, Finish=finish, Resource=resource))
+        if mode not in ['gantt', 'traces', 'heatmap']:
+            raise Exception('Please, select a valid mode.')
+        dates, available, step = Plot.__availability(data, monthly)
+        color = 'rgb(0,191,255)'
+        if mode == 'heatmap':
+            used = available.any(axis=0)
+            fig = go.Figure(go.Heatmap(z=available[:, used].T.astype(np.int8), x=dates, y=data.columns[used],
+                                       colorscale=[[0, 'rgba(0,0,0,0)'], [1, color]], zmin=0, zmax=1,
+                                       showscale=False))
+            start_year, finish_year = dates[available.any(axis=1)][[0, -1]].year
+        else:
+            periods = Plot.__periods(dates, available, data.columns)
+            start_year, finish_year = periods['Start'].min().year, periods['Start'].max().year
+            if mode == 'gantt':
+                periods[['Start', 'Finish']] = periods[['Start', 'Finish']].apply(lambda x: x.dt.strftime('%Y-%m-%d'))
+                fig = ff.create_gantt(periods, colors={'Available data': color}, index_col='Resource',
+                                      show_colorbar=True, showgrid_x=True, showgrid_y=True, group_tasks=True)
             else:
-                print('Station {} has no months with significant data'.format(column))
-        periods = pd.DataFrame(periods)
-        start_year = periods['Start'].apply(lambda x: int(x[:4])).min()
-        finish_year = periods['Start'].apply(lambda x: int(x[:4])).max()
-        colors = {'Available data': 'rgb(0,191,255)'}
-        fig = ff.create_gantt(periods, colors=colors, index_col='Resource', show_colorbar=True, showgrid_x=True,
-                              showgrid_y=True, group_tasks=True)
-
-        fig.layout.xaxis.tickvals = pd.date_range('1/1/' + str(start_year), '12/31/' + str(finish_year + 1), freq='2AS')
+                # Each period is a segment from its first day to the end of its last day or month, and the segments
+                # of a station are separated by None
+                finish = periods['Finish'] + step
+                fig = go.Figure()
+                for task, rows in periods.groupby('Task', sort=False).indices.items():
+                    x = np.full(len(rows) * 3, None, dtype=object)
+                    x[0::3], x[1::3] = periods['Start'].values[rows], finish.values[rows]
+                    fig.add_trace(go.Scattergl(x=x, y=np.where(pd.isnull(x), None, task), mode='lines', name=task,
+                                               line=dict(color=color, width=10), showlegend=False))
+                fig.update_layout(yaxis=dict(type='category', autorange='reversed'))
+
+        fig.layout.xaxis.tickvals = pd.date_range('1/1/' + str(start_year), '12/31/' + str(finish_year + 1), freq='2YS')
         fig.layout.xaxis.ticktext = pd.date_range('1/1/' + str(start_year), '12/31/' + str(finish_year + 1),
-                                                  freq='2AS').year
+                                                  freq='2YS').year
         return fig
 
     @staticmethod
@@ -0,0 +1,103 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class Inventory:
+    """
+    The ANAF inventories of flow and precipitation stations, shipped in hydrobr/resources, so they are available
+    offline.
+
+    Each inventory is read once per process into typed columns (categories for the repeated names, small integers and
+    dates) and indexed by code, state, city and sub-basin, so the lookups do not scan the rows.
+    More information about ANAF: https://doi.org/10.5281/zenodo.3755065
+    """
+
+    _inventories = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def __load(station_type):
+        with Inventory._lock:
+            if station_type not in Inventory._inventories:
+                if station_type not in ['flow', 'prec']:
+                    raise Exception('Please, select a valid station type.')
+                path = os.path.join(os.path.dirname(__file__), 'resources',
+                                    'ANAF_{}_stations.csv'.format(station_type))
+                stations = pd.read_csv(path, dtype={'Name': 'category', 'Code': str, 'Type': np.int8,
+                                                    'SubBasin': np.int8, 'City': 'category', 'State': 'category',
+                                                    'Responsible': 'category', 'NYD': np.int16,
+                                                    'N_YWOMD': np.int16})
+                stations['Code'] = stations['Code'].str.zfill(8)
+                for column in ['StartDate', 'EndDate']:
+                    stations[column] = pd.to_datetime(stations[column], format='%Y/%m/%d')
+                indexes = {column: stations.groupby(column, observed=True).indices
+                           for column in ['State', 'City', 'SubBasin']}
+                indexes['Code'] = dict(zip(stations['Code'], range(len(stations))))
+                indexes['Records'] = None
+                Inventory._inventories[station_type] = (stations, indexes)
+            return Inventory._inventories[station_type]
+
+    @staticmethod
+    def lookup(station_type='flow', state='', city='', sub_basin=None, code=None):
+        """
+        Selects the stations of an ANAF inventory.
+
+        Parameters
+        ----------
+        station_type : string, default 'flow'
+            'flow' for the flow/stage stations or 'prec' for the precipitation stations.
+        state : string
+            Brazilian state name where the stations are located (e.g., RIO DE JANEIRO)
+        city : string
+            Brazilian city name where the stations are located (e.g., ITAPERUNA)
+        sub_basin : int, default None
+            The code of the sub-basin where the stations are located.
+        code : string or list of strings, default None
+            The code of the stations.
+
+        Returns
+        -------
+        list_stations : pandas DataFrame
+            The selected list of stations as a pandas DataFrame
+        """
+        stations, indexes = Inventory.__load(station_type)
+        positions = None
+        for column, key in [('State', state), ('City', city), ('SubBasin', sub_basin)]:
+            if key != '' and key is not None:
+                selected = indexes[column].get(key, np.empty(0, dtype=np.int64))
+                positions = selected if positions is None else np.intersect1d(positions, selected)
+        if code is not None:
+            codes = [f'{int(c):08}' for c in ([code] if isinstance(code, str) else code)]
+            selected = np.array([indexes['Code'][c] for c in codes if c in indexes['Code']], dtype=np.int64)
+            positions = selected if positions is None else positions[np.isin(positions, selected)]
+        if positions is None:
+            return stations.copy()
+        return stations.iloc[positions]
+
+    @staticmethod
+    def station(code, station_type='flow'):
+        """
+        Returns the inventory data of a station as a dict, or None if the station is not in the inventory. Faster
+        than lookup() when the stations are looked up one by one.
+
+        Parameters
+        ----------
+        code : string
+            The code of the station.
+        station_type : string, default 'flow'
+            'flow' for the flow/stage stations or 'prec' for the precipitation stations.
+
+        Returns
+        -------
+        station : dict
+        """
+        stations, indexes = Inventory.__load(station_type)
+        if indexes['Records'] is None:
+            indexes['Records'] = stations.to_dict('records')
+        position = indexes['Code'].get(f'{int(code):08}')
+        if position is None:
+            return None
+        return dict(indexes['Records'][position])
@@ -0,0 +1,154 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from hydrobr.compact import CompactFrame
+
+
+class Load:
+    """
+    Reads the stores saved by hydrobr.SaveAs.
+    """
+
+    @staticmethod
+    def __arrow():
+        try:
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.dataset
+            import pyarrow.fs
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Reading Parquet or Feather requires pyarrow. Install it with 'pip install pyarrow'.")
+        return pyarrow
+
+    @staticmethod
+    def catalog(path, file_format='parquet'):
+        """
+        Lists the stations of a store saved by hydrobr.SaveAs.parquet, reading only the metadata of the files.
+
+        Parameters
+        ----------
+        path : string
+            The computer location of the store.
+        file_format : string, default 'parquet'
+            The format of the store, 'parquet' or 'feather'.
+
+        Returns
+        -------
+        catalog : pandas DataFrame
+            The Source, Variable, Station, Consistency, Start, End and Records of each file of the store.
+        """
+        pa = Load.__arrow()
+        rows = []
+        for file in sorted(glob.glob(os.path.join(path, 'source=*', 'variable=*', 'station=*',
+                                                  'data.{}'.format(file_format)))):
+            if file_format == 'parquet':
+                schema = pa.parquet.read_schema(file)
+            else:
+                with pa.memory_map(file) as source:
+                    schema = pa.ipc.open_file(source).schema
+            metadata = json.loads(schema.metadata[b'hydrobr'])
+            rows.append({'Source': metadata['source'], 'Variable': metadata['variable'],
+                         'Station': metadata['station'], 'Consistency': metadata['consistency'],
+                         'Start': pd.to_datetime(metadata['start']), 'End': pd.to_datetime(metadata['end']),
+                         'Records': metadata['records']})
+        return pd.DataFrame(rows, columns=['Source', 'Variable', 'Station', 'Consistency', 'Start', 'End', 'Records'])
+
+    @staticmethod
+    def parquet(path, source='ANA', variable='flow', stations=None, start_date=None, end_date=None, layout='wide',
+                file_format='parquet'):
+        """
+        Reads the data of a store saved by hydrobr.SaveAs.parquet.
+
+        Only the files of the selected source, variable and stations are opened, and the date range is pushed down to
+        the reader, so only the Parquet row groups that overlap it are read. Feather files are memory-mapped.
+
+        Requires pyarrow (pip install pyarrow).
+
+        Parameters
+        ----------
+        path : string
+            The computer location of the store.
+        source : string, default 'ANA'
+            The source of the data. If None, all the sources.
+        variable : string, default 'flow'
+            The variable of the data. If None, all the variables.
+        stations : list of strings, default None
+            The stations to read. If None, all the stations.
+        start_date : int, float, str, default None
+            The first date to read.
+            See: pandas.to_datetime documentation if have doubts about the date format
+        end_date: int, float, str, default None
+            The last date to read.
+            See: pandas.to_datetime documentation if have doubts about the date format
+        layout : string, default 'wide'
+            'wide' to return a daily DataFrame where each column corresponds to a station, 'compact' to return a
+            hydrobr.CompactFrame, or 'long' to return a DataFrame with the Source, Variable, Station, Date and Value
+            columns.
+        file_format : string, default 'parquet'
+            The format of the store, 'parquet' or 'feather'.
+
+        Returns
+        -------
+        data : pandas DataFrame or hydrobr.CompactFrame
+        """
+        pa = Load.__arrow()
+        ds = pa.dataset
+        if layout not in ['wide', 'compact', 'long']:
+            raise Exception('Please, select a valid layout.')
+        if file_format not in ['parquet', 'feather']:
+            raise Exception('Please, select a valid file format.')
+
+        # Only the files of the selected partitions are opened, and the date filter selects their row groups
+        files = glob.glob(os.path.join(path, 'source={}'.format('*' if source is None else source),
+                                       'variable={}'.format('*' if variable is None else variable), 'station=*',
+                                       'data.{}'.format(file_format)))
+        if stations is not None:
+            stations = {'station={}'.format(station) for station in stations}
+            files = [file for file in files if os.path.basename(os.path.dirname(file)) in stations]
+        if not files:
+            raise Exception('Please, select valid stations.')
+        partitioning = ds.partitioning(pa.schema([('source', pa.string()), ('variable', pa.string()),
+                                                  ('station', pa.string())]), flavor='hive')
+        dataset = ds.dataset(sorted(files), format='parquet' if file_format == 'parquet' else 'ipc',
+                             partitioning=partitioning, partition_base_dir=path,
+                             filesystem=pa.fs.LocalFileSystem(use_mmap=True))
+        expression = ds.field('Date').is_valid()
+        if start_date is not None:
+            expression = expression & (ds.field('Date') >= pa.scalar(pd.to_datetime(start_date).date(), pa.date32()))
+        if end_date is not None:
+            expression = expression & (ds.field('Date') <= pa.scalar(pd.to_datetime(end_date).date(), pa.date32()))
+        table = dataset.to_table(columns=['source', 'variable', 'station', 'Date', 'Value'], filter=expression)
+
+        dates = table.column('Date').to_numpy().astype('datetime64[D]')
+        values = table.column('Value').to_numpy()
+        # The stations are dictionary encoded by Arrow, and their codes sorted by station
+        stations = table.column('station').dictionary_encode().combine_chunks()
+        names = np.array(stations.dictionary.to_pylist(), dtype=object)
+        columns = np.sort(names)
+        codes = np.searchsorted(columns, names)[stations.indices.to_numpy()] if len(names) else np.zeros(0, int)
+        if layout == 'long':
+            return pd.DataFrame({'Source': table.column('source').to_pandas(),
+                                 'Variable': table.column('variable').to_pandas(),
+                                 'Station': pd.Categorical.from_codes(codes, columns),
+                                 'Date': dates.astype('datetime64[ns]'), 'Value': values})
+        if len(pa.compute.unique(table.column('source'))) > 1 or len(pa.compute.unique(table.column('variable'))) > 1:
+            raise Exception('Please, select a source and a variable, or the long layout.')
+
+        # The records are placed on the daily range of each station, from its first to its last read date
+        order = np.lexsort((dates, codes))
+        codes, dates, values = codes[order], dates[order], values[order]
+        first = np.searchsorted(codes, np.arange(len(columns)))
+        last = np.searchsorted(codes, np.arange(len(columns)), side='right') - 1
+        starts, lengths = dates[first], (dates[last] - dates[first]).astype(np.int64) + 1
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+        block_values = np.full(lengths.sum(), np.nan, dtype=values.dtype if values.dtype.kind == 'f' else float)
+        block_values[offsets[codes] + (dates - starts[codes]).astype(np.int64)] = values
+        data = CompactFrame(block_values, starts, lengths, columns)
+        if layout == 'compact':
+            return data
+        return data.to_frame()
@@ -1,13 +1,257 @@
+import warnings
+from math import lgamma
+from multiprocessing import Pool
+
 import numpy as np
 import pandas as pd
-from dateutil.relativedelta import relativedelta
-from tqdm import tqdm
+
+from hydrobr.compact import CompactFrame
+
+# The coefficient of variation of the Weibull distribution for a range of shapes, used to fit it by the method of
+# moments
+_WEIBULL_SHAPES = np.geomspace(0.1, 100, 2000)
+_WEIBULL_CV = np.sqrt(np.exp(np.array([lgamma(1 + 2 / k) - 2 * lgamma(1 + 1 / k) for k in _WEIBULL_SHAPES])) - 1)
+
+
+def _run_shared(task):
+    # Runs a function on some columns of an array in shared memory. Module level, so it can be sent to the worker
+    # processes
+    from multiprocessing import shared_memory
+    name, shape, dtype, first, last, function, args = task
+    memory = shared_memory.SharedMemory(name=name)
+    values = np.ndarray(shape, dtype=dtype, buffer=memory.buf, order='F')[:, first:last]
+    try:
+        return function(values, *args)
+    finally:
+        del values
+        memory.close()
+
+
+def _apply(function, values, args=(), n_jobs=1, size=1024):
+    # Runs function(values[:, first:last], *args) on chunks of up to size columns and returns the list of the results.
+    # With n_jobs > 1, the chunks are run on a pool of processes that read the values from a single shared memory
+    # block, instead of receiving a pickled copy of their chunk
+    n_columns = values.shape[1]
+    if n_jobs <= 1 or n_columns <= 1:
+        return [function(values[:, first:first + size], *args) for first in range(0, max(n_columns, 1), size)]
+    # Imported here, so the package still imports on the Python versions without shared memory
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise ImportError('n_jobs > 1 requires Python 3.8 or later.')
+    size = min(size, -(-n_columns // n_jobs))
+    memory = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    shared = np.ndarray(values.shape, dtype=values.dtype, buffer=memory.buf, order='F')
+    try:
+        shared[:] = values
+        with Pool(min(n_jobs, -(-n_columns // size))) as pool:
+            return pool.map(_run_shared, [(memory.name, values.shape, values.dtype.str, first, first + size, function,
+                                           args) for first in range(0, n_columns, size)])
+    finally:
+        del shared
+        memory.close()
+        memory.unlink()
+
+
+def _filter(valid, index, n_years, missing_percentage):
+    # The stations_filter selection of the stations of a chunk, given their valid values. As in numpy's 'Y' unit, a
+    # year is taken as 365.2425 days.
+    year = 31556952 * 10 ** 9
+    day = 86400 * 10 ** 9
+    dates = index.values.astype('datetime64[ns]').astype(np.int64)
+
+    # This step selects the stations with at least n_years between the first date and the last date of the station.
+    has_data = valid.any(axis=0)
+    first = valid.argmax(axis=0)
+    last = len(valid) - 1 - valid[::-1].argmax(axis=0)
+    selected = has_data & ((dates[last] - dates[first]) / year >= n_years)
+    columns = np.flatnonzero(selected)
+    valid = valid[:, columns]
+    last = last[columns]
+
+    # This last step looks for at least a temporal window with until missing_percentage of missing data. A station is
+    # selected if it has a run of contiguous data with n_years, or if a window of n_years starting at one of its runs,
+    # except the first, ends before the last date of the station and has until missing_percentage of missing data.
+    consecutive = np.diff(dates) == day
+    continued = np.zeros(valid.shape, dtype=bool)
+    continued[1:] = valid[1:] & valid[:-1] & consecutive[:, None]
+    run_ends = valid.copy()
+    run_ends[:-1] &= ~continued[1:]
+    start_column, start_row = np.nonzero((valid & ~continued).T)
+    end_row = np.nonzero(run_ends.T)[1]
+    stations = np.zeros(valid.shape[1], dtype=bool)
+    stations[start_column[(dates[end_row] - dates[start_row]) / year >= n_years]] = True
+
+    rank = np.arange(len(start_column)) - np.searchsorted(start_column, start_column)
+    candidate = (rank >= 1) & ~stations[start_column]
+    column, window_start = start_column[candidate], start_row[candidate]
+    window_end = (index[window_start] + pd.DateOffset(years=n_years)).values
+    within = window_end <= index.values[last[column]]
+    column, window_start, window_end = column[within], window_start[within], window_end[within]
+    window_end = np.searchsorted(index.values, window_end, side='right')
+    missing = np.zeros((len(valid) + 1, valid.shape[1]), dtype=np.int64)
+    np.cumsum(~valid, axis=0, out=missing[1:])
+    missing = (missing[window_end, column] - missing[window_start, column]) / (window_end - window_start)
+    stations[column[missing <= missing_percentage / 100]] = True
+    selected[columns] = stations
+    return selected
+
+
+def _period_days(keys, step):
+    # The calendar length in days of the periods of step months that start at the months keys, counted since the year
+    # 0, so the days of a period that are out of the index count as missing days
+    first = (np.asarray(keys, dtype=np.int64) - 1970 * 12).astype('datetime64[M]')
+    return ((first + step).astype('datetime64[D]') - first.astype('datetime64[D]')).astype(np.int64)
+
+
+def _aggregate(values, keys, step, method, max_missing, percentile):
+    # The resample aggregation of the periods of a chunk of stations, where the periods of step months start at the
+    # changes of keys
+    valid = ~np.isnan(values)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    count = np.add.reduceat(valid, starts, axis=0)
+    missing = _period_days(keys[starts], step)[:, None] - count
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if method in ['sum', 'mean']:
+            aggregated = np.add.reduceat(np.where(valid, values, 0), starts, axis=0)
+            if method == 'mean':
+                aggregated = aggregated / count
+        elif method == 'min':
+            aggregated = np.fmin.reduceat(values, starts, axis=0)
+        elif method == 'max':
+            aggregated = np.fmax.reduceat(values, starts, axis=0)
+        else:
+            aggregated = np.full(count.shape, np.nan)
+            for period, (first, last) in enumerate(zip(starts, np.r_[starts[1:], len(keys)])):
+                has_data = count[period] > 0
+                aggregated[period, has_data] = np.nanpercentile(values[first:last, has_data], percentile, axis=0)
+    aggregated[missing > max_missing] = np.nan
+    return aggregated
+
+
+def _exceedance(values, exceedance):
+    # The values of each column at the exceedance percentages. The missing data is sorted to the end, after the n
+    # valid data of each column
+    values = np.sort(values, axis=0)
+    n = (~np.isnan(values)).sum(axis=0)
+    position = np.maximum(np.ceil(exceedance[:, None] * n / 100 - 1e-9).astype(np.int64) - 1, 0)
+    rows = np.maximum(n - 1 - position, 0)
+    if len(values) == 0:
+        return np.full(rows.shape, np.nan)
+    return np.where(n > 0, values[rows, np.arange(len(n))], np.nan)
+
+
+def _baseflow(values, alpha=0.925, passes=3):
+    # Lyne and Hollick digital filter, applied forwards, backwards and forwards to all the columns at once. The filter
+    # restarts after each missing day
+    baseflow = values.copy()
+    for i in range(passes):
+        flow = baseflow.copy()
+        quickflow = np.zeros(values.shape[1])
+        previous = np.full(values.shape[1], np.nan)
+        for day in (range(len(flow)) if i % 2 == 0 else range(len(flow) - 1, -1, -1)):
+            quickflow = alpha * quickflow + (1 + alpha) / 2 * (flow[day] - previous)
+            quickflow[np.isnan(quickflow)] = 0
+            quickflow = np.minimum(np.maximum(quickflow, 0), flow[day])
+            baseflow[day] = flow[day] - quickflow
+            previous = flow[day]
+    return baseflow
+
+
+def _gaps(valid):
+    # The length of the gap of each missing day, or 0 for the valid days and the missing days before the first or
+    # after the last valid day, with the positions of the previous and the next valid days
+    rows = np.arange(len(valid), dtype=np.int32)[:, None]
+    previous = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    following = np.minimum.accumulate(np.where(valid, rows, len(valid))[::-1], axis=0)[::-1]
+    length = np.where(~valid & (previous >= 0) & (following < len(valid)), following - previous - 1, 0)
+    return length, previous, following
+
+
+def _interpolate(values, max_length):
+    # Linear interpolation of the gaps of up to max_length days of a chunk of stations
+    valid = ~np.isnan(values)
+    length, previous, following = _gaps(valid)
+    interpolated = (length > 0) & (length <= max_length)
+    columns = np.broadcast_to(np.arange(values.shape[1]), values.shape)[interpolated]
+    before, after = values[previous[interpolated], columns], values[following[interpolated], columns]
+    rows = np.nonzero(interpolated)[0]
+    filled = values.copy()
+    filled[interpolated] = before + (after - before) * (rows - previous[interpolated]) / \
+        (following[interpolated] - previous[interpolated])
+    return filled, interpolated, length
+
+
+def _regression(values, min_overlap):
+    # The statistics of all the pairs of stations over the days where both are valid, computed at once with matrix
+    # products: the correlation, and the slope and intercept of the regression of each station (rows) on each other
+    # station (columns)
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0)
+    m = valid.astype(float)
+    n = m.T @ m
+    sum_x = x.T @ m
+    sum_xx = (x * x).T @ m
+    cross = x.T @ x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = cross - sum_x * sum_x.T / n
+        variance = sum_xx - sum_x ** 2 / n
+        correlation = covariance / np.sqrt(variance * variance.T)
+        slope = covariance / variance.T
+        intercept = (sum_x - slope * sum_x.T) / n
+    correlation[n < max(min_overlap, 2)] = np.nan
+    np.fill_diagonal(correlation, np.nan)
+    return correlation, slope, intercept
+
+
+def _signatures(values, keys, max_missing, return_period):
+    # The signatures of a chunk of stations
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    valid = ~np.isnan(values)
+    missing = _period_days(keys[starts], 12)[:, None] - np.add.reduceat(valid, starts, axis=0, dtype=np.int64)
+    # The years with more than max_missing days with missing data, counting the days out of the index, are discarded
+    valid_years = missing <= max_missing
+    values = np.where(np.repeat(valid_years, np.diff(np.r_[starts, len(keys)]), axis=0), values, np.nan)
+
+    # The stations without valid years give NaN signatures
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        annual_max = np.fmax.reduceat(values, starts, axis=0)
+        annual_max[~valid_years] = np.nan
+
+        # The 7-day mean flows, assigned to the year of their last day
+        valid = ~np.isnan(values)
+        total = np.cumsum(np.where(valid, values, 0), axis=0)
+        count = np.cumsum(valid, axis=0)
+        mean_7 = np.full(values.shape, np.nan)
+        mean_7[6:] = (total[6:] - np.r_[np.zeros((1, values.shape[1])), total[:-7]]) / 7
+        mean_7[6:][(count[6:] - np.r_[np.zeros((1, values.shape[1])), count[:-7]]) < 7] = np.nan
+        annual_min_7 = np.fmin.reduceat(mean_7, starts, axis=0)
+        annual_min_7[~valid_years] = np.nan
+
+        # Q7,10 from a Weibull distribution of the annual 7-day minima fitted by the method of moments
+        n_years = (~np.isnan(annual_min_7)).sum(axis=0)
+        mean = np.nanmean(annual_min_7, axis=0)
+        std = np.nanstd(annual_min_7, axis=0, ddof=1)
+        shape = np.interp(std / mean, _WEIBULL_CV[::-1], _WEIBULL_SHAPES[::-1])
+        scale = mean / np.exp(np.array([lgamma(1 + 1 / k) for k in shape]))
+        q7 = scale * (-np.log(1 - 1 / return_period)) ** (1 / shape)
+        q7[std == 0] = mean[std == 0]
+        q7[mean == 0] = 0
+        q7[n_years < 2] = np.nan
+
+        baseflow = _baseflow(values)
+        both = ~np.isnan(baseflow)
+        bfi = np.where(both, baseflow, 0).sum(axis=0) / np.where(both, values, 0).sum(axis=0)
+        table = np.column_stack([np.nanmean(values, axis=0), _exceedance(values, np.array([90.]))[0], q7, bfi,
+                                 valid_years.sum(axis=0)])
+    return table, annual_max
 
 
 class PreProcessing:
 
     @staticmethod
-    def stations_filter(data, n_years=10, missing_percentage=5, start_date=False, end_date=False):
+    def stations_filter(data, n_years=10, missing_percentage=5, start_date=False, end_date=False, n_jobs=1):
         """
         A composed method to filter stations. 
         
@@ -18,7 +262,7 @@ class PreProcessing:
 
         Parameters
         ----------
-        data : pandas DataFrame
+        data : pandas DataFrame or hydrobr.CompactFrame
             A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station.
         n_years: int, default 10
             The minimum number of years of registered data for the station between the first date and the end date.
@@ -31,12 +275,22 @@ class PreProcessing:
         end_date: int, float, str, default False
             The desired end date for the output DataFrame.
             See: pandas.to_datetime documentation if have doubts about the date format
+        n_jobs : int, default 1
+            The number of processes. With n_jobs > 1, the stations are split in chunks that are filtered in parallel.
 
         Returns
         -------
-        data : pandas DataFrame
+        data : pandas DataFrame or hydrobr.CompactFrame
             A pandas DataFrame with only the filtered stations
         """
+        if isinstance(data, CompactFrame):
+            # The stations are filtered in chunks, so the wide DataFrame is never built for all of them at once
+            stations = []
+            for chunk in data.chunks(1024, start_date or None, end_date or None):
+                stations.extend(PreProcessing.stations_filter(chunk, n_years, missing_percentage,
+                                                              n_jobs=n_jobs).columns)
+            return data.select(stations, start_date or None, end_date or None)
+
         # If the start and/or end date is given this step selects the temporal window in the dataset
         if start_date != False and end_date != False:
             start_date = pd.to_datetime([start_date])
@@ -49,58 +303,15 @@ class PreProcessing:
             end_date = pd.to_datetime([end_date])
             data = data.loc[:end_date[0]]
 
-        # This step selects the stations with at least n_years between the first date and the last date of the station.
-        stations = []
-        for column in data.columns:
-            series = data[column]
-            series_drop = series.dropna()
-            if len(series_drop) > 0:
-                years = (series_drop.index[-1] - series_drop.index[0]) / np.timedelta64(1, 'Y')
-                if years >= n_years:
-                    stations.append(column)
-        data = data[stations]
-
-        # This last step looks for at least a temporal window with until missing_percentage of missing data.
-        stations = []
-        state = 0
-        for column in tqdm(data.columns):
-            series = data[column]
-            series_drop = series.dropna()
-            periods = []
-            start1 = series_drop.index[0]
-            finish1 = 0
-            for i in range(len(series_drop)):
-                if i != 0 and (series_drop.index[i] - series_drop.index[i - 1]) / np.timedelta64(1, 'D') != 1:
-                    finish1 = series_drop.index[i - 1]
-                    periods.append(
-                        dict(Start=start1, Finish=finish1, Interval=(finish1 - start1) / np.timedelta64(1, 'Y')))
-                    start1 = series_drop.index[i]
-                    finish1 = 0
-            finish1 = series_drop.index[-1]
-            periods.append(dict(Start=start1, Finish=finish1, Interval=(finish1 - start1) / np.timedelta64(1, 'Y')))
-            periods = pd.DataFrame(periods)
-            if len(periods[periods['Interval'] >= n_years]) > 0:
-                stations.append(column)
-            else:
-                j = 0
-                aux = 0
-                while j < len(periods) and aux == 0:
-                    j += 1
-                    if periods['Start'][j] + relativedelta(years=n_years) <= periods['Finish'][periods.index[-1]]:
-                        series_period = series.loc[
-                                        periods['Start'][j]:periods['Start'][j] + relativedelta(years=n_years)]
-                        missing = series_period.isnull().sum() / len(series_period)
-                        if missing <= missing_percentage / 100 and aux == 0:
-                            aux = 1
-                            stations.append(column)
-                    else:
-                        aux = 1
-            state += 1
-        data = data[stations]
+        # The record span and the runs of contiguous data are computed for chunks of 1024 stations at once, on the 2-D
+        # array of valid values
+        valid = np.asfortranarray(data.notna().values, dtype=bool)
+        stations = np.concatenate(_apply(_filter, valid, (data.index, n_years, missing_percentage), n_jobs))
+        data = data.loc[:, stations[:len(data.columns)]]
         return data
 
     @staticmethod
-    def daily_to_monthly(data, method='sum'):
+    def daily_to_monthly(data, method='sum', max_missing=0, n_jobs=1):
         """
         Transform a time series of daily data into a time series monthly data.
 
@@ -108,31 +319,445 @@ class PreProcessing:
 
         Parameters
         ----------
-        data : pandas DataFrame
+        data : pandas DataFrame or hydrobr.CompactFrame
             A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station.
         method: str, default sum
             The method used to convert. If 'sum', the monthly data will be the sum of the daily data. If 'mean', the
             monthly data will be the mean of the daily data.
+        max_missing: int, default 0
+            The maximum number of days with missing data of a valid month.
+        n_jobs : int, default 1
+            The number of processes, see resample.
 
         Returns
         -------
         monthly_data : pandas DataFrame
             The  monthly pandas DataFrame
         """
+        if method not in ['sum', 'mean']:
+            raise Exception('Please select a valid method.')
+        return PreProcessing.resample(data, 'monthly', method, max_missing, n_jobs=n_jobs)
+
+    @staticmethod
+    def resample(data, freq='monthly', method='sum', max_missing=0, percentile=50, start_month=10, n_jobs=1):
+        """
+        Aggregates a time series of daily data into monthly, annual or hydrological year data.
+
+        All the stations are aggregated at once. A period with more than max_missing days with missing data is
+        considered as a missing period, counting the days of the period that are out of the index as missing, so the
+        partial periods at the ends of the data are missing periods. The output goes from the first to the last valid
+        period of the stations.
+
+        Parameters
+        ----------
+        data : pandas DataFrame or hydrobr.CompactFrame
+            A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station.
+        freq : str, default 'monthly'
+            The aggregation period, 'monthly', 'annual' or 'hydrological'. The periods are labeled by their first day.
+        method : str, default 'sum'
+            The aggregation of the daily data of each period, 'sum', 'mean', 'min', 'max' or 'percentile'.
+        max_missing : int, default 0
+            The maximum number of days with missing data of a valid period.
+        percentile : float, default 50
+            The percentile, between 0 and 100, used by the 'percentile' method.
+        start_month : int, default 10
+            The first month of the hydrological year, used by the 'hydrological' freq.
+        n_jobs : int, default 1
+            The number of processes. With n_jobs > 1, the stations are split in chunks that are aggregated in parallel
+            from a single copy of the data in shared memory.
+
+        Returns
+        -------
+        resampled_data : pandas DataFrame
+            The aggregated pandas DataFrame
+        """
+        if isinstance(data, CompactFrame):
+            resampled_data = pd.concat([PreProcessing.resample(chunk, freq, method, max_missing, percentile,
+                                                               start_month, n_jobs) for chunk in data.chunks()],
+                                       axis=1)
+            if resampled_data.empty:
+                return resampled_data
+            step = 1 if freq == 'monthly' else 12
+            return resampled_data.reindex(pd.date_range(resampled_data.index[0], resampled_data.index[-1],
+                                                        freq=pd.DateOffset(months=step)))
+
+        # Each day is keyed by the number of its month since the year 0, and each period by the key of its first month
+        months = np.asarray(data.index.year * 12 + data.index.month - 1)
+        if freq == 'monthly':
+            keys, step = months, 1
+        elif freq == 'annual':
+            keys, step = months - months % 12, 12
+        elif freq == 'hydrological':
+            keys, step = months - (months - start_month + 1) % 12, 12
+        else:
+            raise Exception('Please select a valid frequency.')
+        if method not in ['sum', 'mean', 'min', 'max', 'percentile']:
+            raise Exception('Please select a valid method.')
+        if len(data) == 0:
+            return pd.DataFrame(columns=data.columns, dtype=float)
+
+        values = np.asfortranarray(data.values, dtype=float)
+        aggregated = np.concatenate(_apply(_aggregate, values, (keys, step, method, max_missing, percentile), n_jobs),
+                                    axis=1)[:, :len(data.columns)]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+        # The periods are placed on a regular index, from the first to the last valid period of the stations
+        periods = (keys[starts] - keys[0]) // step
+        resampled = np.full((periods[-1] + 1, len(data.columns)), np.nan)
+        resampled[periods] = aggregated
+        has_data = ~np.isnan(resampled).all(axis=1)
+        if not has_data.any():
+            return pd.DataFrame(columns=data.columns, dtype=float)
+        first, last = has_data.argmax(), len(has_data) - has_data[::-1].argmax()
+        index = (keys[0] - 1970 * 12 + step * np.arange(first, last)).astype('datetime64[M]').astype('datetime64[ns]')
+        resampled_data = pd.DataFrame(resampled[first:last], index=pd.DatetimeIndex(index), columns=data.columns)
+        return resampled_data
+
+    @staticmethod
+    def fdc(data, exceedance=(50, 90, 95)):
+        """
+        Evaluates the flow duration curve of each station at some exceedance percentages, e.g. Q90 is the flow
+        exceeded 90% of the time.
+
+        All the stations are sorted at once, in chunks of 1024 stations. As in Plot.fdc, the flow at the exceedance p
+        of a station with n valid data is the one at the position ceil(p * n / 100) of its data sorted in descending
+        order.
+
+        Parameters
+        ----------
+        data : pandas DataFrame or hydrobr.CompactFrame
+            A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station.
+        exceedance : list of floats, default (50, 90, 95)
+            The exceedance percentages, between 0 and 100.
+
+        Returns
+        -------
+        fdc_table : pandas DataFrame
+            The flow of each station (rows) at each exceedance (columns, named Q50, Q90, ...).
+        """
+        exceedance = np.asarray(exceedance, dtype=float)
+        if ((exceedance < 0) | (exceedance > 100)).any():
+            raise Exception('Please select valid exceedance percentages.')
+        columns = ['Q{:g}'.format(p) for p in exceedance]
+        chunks = data.chunks() if isinstance(data, CompactFrame) else \
+            (data.iloc[:, first:first + 1024] for first in range(0, len(data.columns), 1024))
+
+        tables = [pd.DataFrame(_exceedance(chunk.values.astype(float), exceedance).T, index=chunk.columns,
+                               columns=columns) for chunk in chunks]
+        if not tables:
+            return pd.DataFrame(columns=columns, dtype=float)
+        return pd.concat(tables)
+
+    @staticmethod
+    def signatures(data, max_missing=0, start_month=1, return_period=10, n_jobs=1):
+        """
+        Computes hydrological signatures of daily flow series: the mean flow (Qmean), the flow exceeded 90% of the
+        time (Q90), the 7-day low flow of the return period (e.g. Q7,10), the baseflow index (BFI) and the annual
+        maxima.
+
+        All the stations are computed at once, in chunks of 1024 stations that are spread over n_jobs processes. As in
+        resample, a year with more than max_missing days with missing data, counting its days out of the index, is
+        considered as a missing year, and its data is not used by any signature.
+
+        The Q7,10 is given by a Weibull distribution fitted by the method of moments to the annual minima of the 7-day
+        mean flows, and requires two valid years. The baseflow is separated by the Lyne and Hollick filter (alpha of
+        0.925, three passes).
+
+        Parameters
+        ----------
+        data : pandas DataFrame or hydrobr.CompactFrame
+            A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station.
+        max_missing : int, default 0
+            The maximum number of days with missing data of a valid year.
+        start_month : int, default 1
+            The first month of the years, e.g. 10 for hydrological years starting in October.
+        return_period : float, default 10
+            The return period in years of the 7-day low flow.
+        n_jobs : int, default 1
+            The number of processes.
 
-        monthly_data = pd.DataFrame()
-        for column in data.columns:
-            series = data[column]
-            if method == 'sum':
-                monthly_series = series.groupby(pd.Grouper(freq='1MS')).sum().to_frame()
-            elif method == 'mean':
-                monthly_series = series.groupby(pd.Grouper(freq='1MS')).mean().to_frame()
-            else:
-                raise Exception('Please select a valid method.')
-            missing = series.isnull().groupby(pd.Grouper(freq='1MS')).sum().to_frame()
-            to_drop = missing.loc[missing[column] > 0]  # A month with a missing data is a missing month
-            monthly_series = monthly_series.drop(index=to_drop.index).sort_index()
-            data_index = pd.date_range(monthly_series.index[0], monthly_series.index[-1], freq='MS')
-            monthly_series = monthly_series.reindex(data_index)
-            monthly_data = pd.concat([monthly_data, monthly_series], axis=1)
-        return monthly_data
+        Returns
+        -------
+        signatures : pandas DataFrame
+            The Qmean, Q90, Q7,10, BFI and the number of valid Years of each station.
+        annual_maxima : pandas DataFrame
+            The maximum flow of each valid year, labeled by its first day, where each column corresponds to a station.
+        """
+        columns = ['Qmean', 'Q90', 'Q{:g},{:g}'.format(7, return_period), 'BFI', 'Years']
+        if len(data.columns) == 0 or len(data) == 0:
+            return pd.DataFrame(columns=columns, dtype=float), pd.DataFrame(dtype=float)
+        # The chunks of a CompactFrame are placed on its whole index, so the years are counted as in the DataFrame
+        index = data.index
+        chunks = [chunk.reindex(index) for chunk in data.chunks(1024)] if isinstance(data, CompactFrame) else [data]
+
+        # Each day is keyed by the number of the first month of its year since the year 0
+        months = np.asarray(index.year * 12 + index.month - 1)
+        keys = months - (months - start_month + 1) % 12
+        results = [result for chunk in chunks for result in _apply(
+            _signatures, np.asfortranarray(chunk.values, dtype=float), (keys, max_missing, return_period), n_jobs)]
+
+        signatures = pd.DataFrame(np.concatenate([table for table, _ in results]), index=data.columns,
+                                  columns=columns)
+        signatures['Years'] = signatures['Years'].astype(int)
+        years = (np.unique(keys) - 1970 * 12).astype('datetime64[M]').astype('datetime64[ns]')
+        annual_maxima = pd.DataFrame(np.concatenate([annual_max for _, annual_max in results], axis=1),
+                                     index=pd.DatetimeIndex(years), columns=signatures.index)
+        has_data = annual_maxima.notna().any(axis=1)
+        if has_data.any():
+            annual_maxima = annual_maxima.loc[has_data.idxmax():has_data[::-1].idxmax()]
+        return signatures, annual_maxima
+
+    @staticmethod
+    def correlation(data, min_overlap=365):
+        """
+        Computes the correlation matrix of the stations, each pair over the days where both stations have data.
+
+        Parameters
+        ----------
+        data : pandas DataFrame or hydrobr.CompactFrame
+            A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station.
+        min_overlap : int, default 365
+            The minimum number of days with data of both stations of a pair. The correlation of the pairs with less
+            days is NaN.
+
+        Returns
+        -------
+        correlation : pandas DataFrame
+            The correlation of each pair of stations, NaN in the diagonal.
+        """
+        if isinstance(data, CompactFrame):
+            data = data.to_frame()
+        correlation = _regression(data.values.astype(float), min_overlap)[0]
+        return pd.DataFrame(correlation, index=data.columns, columns=data.columns)
+
+    @staticmethod
+    def fill_gaps(data, max_interpolation=3, max_gap=None, n_neighbors=3, min_correlation=0.8, min_overlap=365,
+                  correlation=None):
+        """
+        Fills the gaps of daily series, by linear interpolation for the short gaps and by linear regression on the
+        best correlated neighbor stations for the longer ones.
+
+        The gaps before the first and after the last valid day of a station are not filled. The regressions of all the
+        pairs of stations are fitted at once, over the days where both stations have data, and a missing day is filled
+        by the best correlated neighbor that has data on it. Only observed data is used as predictor, and the filled
+        values are not negative.
+
+        Parameters
+        ----------
+        data : pandas DataFrame or hydrobr.CompactFrame
+            A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station.
+        max_interpolation : int, default 3
+            The maximum length in days of the gaps filled by linear interpolation.
+        max_gap : int, default None
+            The maximum length in days of the gaps filled by regression. If None, all the gaps.
+        n_neighbors : int, default 3
+            The maximum number of neighbors of a station.
+        min_correlation : float, default 0.8
+            The minimum correlation of a neighbor.
+        min_overlap : int, default 365
+            The minimum number of days with data of a station and its neighbor.
+        correlation : pandas DataFrame, default None
+            A correlation matrix used to select the neighbors, e.g. the one of PreProcessing.correlation with the
+            pairs that are too far apart set to NaN. The pairs with less than min_overlap days with data of both
+            stations are not used in any case. If None, the correlation of the data.
+
+        Returns
+        -------
+        filled_data : pandas DataFrame
+            The data with the gaps filled.
+        flags : pandas DataFrame
+            The quality flag of each value: 0 for observed data, 1 for interpolated data, 2 for data filled by
+            regression and -1 for the remaining missing data.
+        """
+        if isinstance(data, CompactFrame):
+            data = data.to_frame()
+        values = np.asfortranarray(data.values, dtype=float)
+        results = _apply(_interpolate, values, (max_interpolation,))
+        filled = np.concatenate([result[0] for result in results], axis=1)
+        flags = np.where(np.isnan(values), -1, 0).astype(np.int8)
+        flags[np.concatenate([result[1] for result in results], axis=1)] = 1
+        length = np.concatenate([result[2] for result in results], axis=1)
+        del results
+
+        # The neighbors of each station sorted by their correlation
+        stations_correlation, slope, intercept = _regression(values, min_overlap)
+        if correlation is not None:
+            # The pairs without a valid regression, e.g. with less than min_overlap common days, are not neighbors
+            stations_correlation = np.where(np.isnan(stations_correlation), np.nan, correlation.reindex(
+                index=data.columns, columns=data.columns).values.astype(float))
+        stations_correlation = np.where(stations_correlation >= min_correlation, stations_correlation, -np.inf)
+        neighbors = np.argsort(-stations_correlation, axis=1, kind='stable')[:, :n_neighbors]
+
+        for first in range(0, len(data.columns), 1024):
+            stations = np.arange(first, min(first + 1024, len(data.columns)))
+            remaining = (length[:, stations] > max_interpolation) & (flags[:, stations] == -1)
+            if max_gap is not None:
+                remaining &= length[:, stations] <= max_gap
+            for rank in range(neighbors.shape[1]):
+                neighbor = neighbors[stations, rank]
+                has_neighbor = np.isfinite(stations_correlation[stations, neighbor])
+                predictor = values[:, neighbor]
+                with np.errstate(invalid='ignore'):
+                    estimate = np.maximum(intercept[stations, neighbor] + slope[stations, neighbor] * predictor, 0)
+                use = remaining & has_neighbor & np.isfinite(estimate)
+                filled[:, stations] = np.where(use, estimate, filled[:, stations])
+                flags[:, stations] = np.where(use, 2, flags[:, stations])
+                remaining &= ~use
+        return pd.DataFrame(filled, index=data.index, columns=data.columns), \
+            pd.DataFrame(flags, index=data.index, columns=data.columns)
+
+
+class CompletenessIndex:
+    """
+    Precomputed completeness of the stations of a daily DataFrame, to answer many window selection queries without
+    scanning the data again.
+
+    The index keeps the cumulative number of valid days of each station. A window starts at a date of the DataFrame and
+    ends n_years later, both dates included, as in PreProcessing.stations_filter. The first time a n_years is queried,
+    the minimum missing fraction of the windows starting in each block of dates is computed for all the stations. A
+    query then reads the minima of the blocks covering its date range, plus the up to 2 * block_size windows at its
+    ends that are not in a whole block. Its cost is proportional to the number of stations times the number of blocks
+    plus 2 * block_size, i.e. about 3 * sqrt(n_days) per station with the default block size, instead of the n_days
+    windows of a scan of the series.
+
+    Example
+    -------
+    >>> index = hydrobr.CompletenessIndex(data)
+    >>> data[index.query(n_years=10, missing_percentage=5, start_date='1980', end_date='2010')]
+    """
+
+    def __init__(self, data, block_size=None):
+        """
+        Parameters
+        ----------
+        data : pandas DataFrame or hydrobr.CompactFrame
+            A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station.
+        block_size : int, default None
+            The number of window starts of each block. If None, the square root of the length of the series.
+        """
+        self.index = data.index
+        self.columns = data.columns
+        self.counts = np.zeros((len(data) + 1, len(data.columns)), dtype=np.int32)
+        np.cumsum(data.notna().values, axis=0, dtype=np.int32, out=self.counts[1:])
+        self.block_size = block_size or max(1, int(np.sqrt(len(data))))
+        self.__windows = {}
+
+    def __missing(self, windows, first, last):
+        # Missing fraction of the windows starting at the positions first to last - 1, for all the stations
+        starts = np.arange(first, last)
+        ends, lengths = windows['ends'][first:last], windows['lengths'][first:last]
+        valid = self.counts[ends] - self.counts[starts]
+        return (lengths[:, None] - valid) / lengths[:, None]
+
+    def __get_windows(self, n_years):
+        if n_years not in self.__windows:
+            window_ends = self.index + pd.DateOffset(years=n_years)
+            # Only the windows that end inside the series are complete
+            n_starts = 0
+            if len(self.index):
+                n_starts = np.searchsorted(window_ends.values, self.index.values[-1], side='right')
+            windows = {'end_dates': window_ends[:n_starts],
+                       'ends': np.searchsorted(self.index.values, window_ends.values[:n_starts], side='right')}
+            windows['lengths'] = windows['ends'] - np.arange(n_starts)
+            n_blocks = n_starts // self.block_size
+            windows['minimum'] = np.empty((n_blocks, len(self.columns)))
+            windows['argmin'] = np.empty((n_blocks, len(self.columns)), dtype=np.int64)
+            for block in range(n_blocks):
+                first = block * self.block_size
+                missing = self.__missing(windows, first, first + self.block_size)
+                windows['argmin'][block] = first + missing.argmin(axis=0)
+                windows['minimum'][block] = missing.min(axis=0)
+            self.__windows[n_years] = windows
+        return self.__windows[n_years]
+
+    def __best(self, n_years, start_date, end_date):
+        # Position and missing fraction of the best window of each station, and the end dates of the windows
+        windows = self.__get_windows(n_years)
+        first = 0
+        if start_date is not None:
+            first = np.searchsorted(self.index.values, pd.to_datetime(start_date).to_datetime64())
+        last = len(windows['ends'])
+        if end_date is not None:
+            last = np.searchsorted(windows['end_dates'].values, pd.to_datetime(end_date).to_datetime64(), side='right')
+
+        missing = np.full(len(self.columns), np.nan)
+        start = np.zeros(len(self.columns), dtype=np.int64)
+        if first >= last:
+            return start, missing, windows['end_dates']
+        stations = np.arange(len(self.columns))
+        first_block, last_block = -(-first // self.block_size), last // self.block_size
+        if first_block < last_block:
+            best = first_block + windows['minimum'][first_block:last_block].argmin(axis=0)
+            missing = windows['minimum'][best, stations]
+            start = windows['argmin'][best, stations]
+            parts = [(first, first_block * self.block_size), (last_block * self.block_size, last)]
+        else:
+            parts = [(first, last)]
+        for part_first, part_last in parts:
+            if part_first < part_last:
+                part = self.__missing(windows, part_first, part_last)
+                part_missing = part.min(axis=0)
+                # On ties the earliest window is kept, and the first part comes before the blocks
+                if part_first == first:
+                    better = (part_missing <= missing) | np.isnan(missing)
+                else:
+                    better = part_missing < missing
+                start = np.where(better, part_first + part.argmin(axis=0), start)
+                missing = np.where(better, part_missing, missing)
+        return start, missing, windows['end_dates']
+
+    def best_windows(self, n_years=10, start_date=None, end_date=None):
+        """
+        Returns the window of n_years with the lowest missing data percentage of each station inside a date range.
+
+        Parameters
+        ----------
+        n_years: int, default 10
+            The number of years of the windows.
+        start_date : int, float, str, default None
+            The first date of the windows. If None, the first date of the DataFrame.
+            See: pandas.to_datetime documentation if have doubts about the date format
+        end_date: int, float, str, default None
+            The last date of the windows. If None, the last date of the DataFrame.
+            See: pandas.to_datetime documentation if have doubts about the date format
+
+        Returns
+        -------
+        windows : pandas DataFrame
+            A DataFrame indexed by the stations, with the Start, End and Missing percentage of their best window. On
+            ties the earliest window is returned. The values are NaN if no window fits in the date range.
+        """
+        start, missing, end_dates = self.__best(n_years, start_date, end_date)
+        has_window = ~np.isnan(missing)
+        windows = pd.DataFrame({'Start': pd.NaT, 'End': pd.NaT, 'Missing': missing * 100}, index=self.columns)
+        if has_window.any():
+            windows['Start'] = self.index[start].where(has_window)
+            windows['End'] = end_dates[start].where(has_window)
+        return windows
+
+    def query(self, n_years=10, missing_percentage=5, start_date=None, end_date=None):
+        """
+        Selects the stations that have at least one window of n_years with until missing_percentage of missing data
+        inside a date range.
+
+        Parameters
+        ----------
+        n_years: int, default 10
+            The number of years of the windows.
+        missing_percentage: int, default 5
+            The maximum missing data percentage in a window with n_years.
+            A number between 0 and 100
+        start_date : int, float, str, default None
+            The first date of the windows. If None, the first date of the DataFrame.
+            See: pandas.to_datetime documentation if have doubts about the date format
+        end_date: int, float, str, default None
+            The last date of the windows. If None, the last date of the DataFrame.
+            See: pandas.to_datetime documentation if have doubts about the date format
+
+        Returns
+        -------
+        stations : pandas Index
+            The selected stations.
+        """
+        missing = self.__best(n_years, start_date, end_date)[1]
+        return self.columns[missing <= missing_percentage / 100]
@@ -1,85 +1,147 @@
+import itertools
+import json
 import os
+from multiprocessing import Pool
+
 import pandas as pd
-import locale
+
+
+def _write_asc(task):
+    # Writes the ASCII file of a station with a single formatting operation. It is at module level so the process
+    # pool can pickle it.
+    series, file_path, flow = task
+    series = series.round(6 if flow else 2).dropna()
+    if series.empty:
+        return
+    series = series.reindex(pd.date_range(series.index[0], series.index[-1], freq='D')).fillna(-1.00)
+    if flow:
+        # The values are formatted with a thousands separator, as by the en_US locale, and the wider values get a
+        # wider field
+        values = list(map('{:,.6f}'.format, series.values.tolist()))
+        widths = [16 if len(value) < 11 else 18 for value in values]
+        rows = zip(series.index.day.tolist(), series.index.month.tolist(), series.index.year.tolist(), widths, values)
+        template = '%6d%6d%6d%*s\n'
+    else:
+        rows = zip(series.index.day.tolist(), series.index.month.tolist(), series.index.year.tolist(),
+                   series.values.tolist())
+        template = '%6d%6d%6d%12.2f\n'
+    with open(file_path, 'w') as arq:
+        arq.write((template * len(series)) % tuple(itertools.chain.from_iterable(rows)))
 
 
 class SaveAs:
 
     @staticmethod
-    def asc_daily_prec(data, path_save):
+    def __asc_daily(data, path_save, flow, n_jobs):
+        if not os.path.exists(path_save):
+            os.makedirs(path_save)
+        tasks = ((data[station], os.path.join(os.getcwd(), path_save, '{:0>8}.txt'.format(str(station))), flow)
+                 for station in data.columns)
+        if n_jobs == 1:
+            for task in tasks:
+                _write_asc(task)
+        else:
+            with Pool(n_jobs) as pool:
+                for _ in pool.imap_unordered(_write_asc, tasks, chunksize=8):
+                    pass
+
+    @staticmethod
+    def asc_daily_prec(data, path_save, n_jobs=1):
         """
         Save each column of the precipitation stations DataFrame into a ".txt" file in the ASCII standard.
 
         Parameters
         ----------
-        data : pandas DataFrame
+        data : pandas DataFrame or hydrobr.CompactFrame
             A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station.
         path_save: string
             The computer location where the ".txt" files will be saved.
+        n_jobs: int, default 1
+            The number of processes that write the files. If None, the number of CPUs.
 
         Returns
         -------
         """
-
-        if not os.path.exists(path_save):
-            os.makedirs(path_save)
-        stations = list(data.columns.values)
-        for i in range(len(stations)):
-            file_name = str(stations[i])
-            while len(file_name) < 8:
-                file_name = '0' + file_name
-            file_name = file_name + '.txt'
-            df = data[stations[i]].to_frame().round(2)
-            df = df.dropna()
-            date_index = pd.date_range(df.index[0], df.index[-1], freq='D')
-            df = df.reindex(date_index)
-            df = df.fillna(-1.00)
-            df = df.round(decimals=2)
-            arq = open(os.path.join(os.path.join(os.getcwd(), path_save), file_name), 'w')
-            list_dado = []
-            for j in df.index:
-                dado = df[stations[i]][j]
-                list_dado.append(dado)
-                arq.write('{:>6}{:>6}{:>6}{:>12}\n'.format(j.day, j.month, j.year, format(dado, '.2f')))
-            arq.close()
+        SaveAs.__asc_daily(data, path_save, False, n_jobs)
 
     @staticmethod
-    def asc_daily_flow(data, path_save):
+    def asc_daily_flow(data, path_save, n_jobs=1):
         """
         Save each column of the flow stations DataFrame into a ".txt" file in the ASCII standard.
 
         Parameters
         ----------
-        data : pandas DataFrame
+        data : pandas DataFrame or hydrobr.CompactFrame
             A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station.
         path_save: string
             The computer location where the ".txt" files will be saved.
+        n_jobs: int, default 1
+            The number of processes that write the files. If None, the number of CPUs.
 
         Returns
         -------
         """
+        SaveAs.__asc_daily(data, path_save, True, n_jobs)
 
-        locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
-        if not os.path.exists(path_save):
-            os.makedirs(path_save)
-        stations = list(data.columns.values)
-        for i in range(len(stations)):
-            file_name = str(stations[i])
-            while len(file_name) < 8:
-                file_name = '0' + file_name
-            file_name = file_name + '.txt'
-            df = data[stations[i]].to_frame().round(6)
-            df = df.dropna()
-            date_index = pd.date_range(df.index[0], df.index[-1], freq='D')
-            df = df.reindex(date_index)
-            df = df.fillna(-1.00)
-            df = df.round(decimals=6)
-            arq = open(os.path.join(os.path.join(os.getcwd(), path_save), file_name), 'w')
-            for j in df.index:
-                dado = df[stations[i]][j]
-                dado = locale.format_string('%.6f', dado, True)
-                if len(dado) < 11:
-                    arq.write('{:>6}{:>6}{:>6}{:>16}\n'.format(j.day, j.month, j.year, dado))
-                else:
-                    arq.write('{:>6}{:>6}{:>6}{:>18}\n'.format(j.day, j.month, j.year, dado))
-            arq.close()
+    @staticmethod
+    def parquet(data, path_save, source='ANA', variable='flow', consistency=None, file_format='parquet'):
+        """
+        Save each column of the stations DataFrame into a columnar store partitioned by source, variable and station,
+        which is read by hydrobr.Load.parquet.
+
+        The valid data of each station is saved sorted by date in the file
+        path_save/source=<source>/variable=<variable>/station=<station>/data.<file_format>, replacing the data
+        previously saved for the station. The source, variable, station, consistency, first and last dates and number
+        of records are kept in the metadata of the file.
+
+        Requires pyarrow (pip install pyarrow).
+
+        Parameters
+        ----------
+        data : pandas DataFrame or hydrobr.CompactFrame
+            A Pandas daily DataFrame with DatetimeIndex where each column corresponds to a station.
+        path_save: string
+            The computer location of the store.
+        source : string, default 'ANA'
+            The source of the data.
+        variable : string, default 'flow'
+            The variable of the data, e.g. 'flow', 'prec' or 'stage'.
+        consistency : string, default None
+            The consistency level of the data, e.g. 'consisted' for the data got with only_consisted=True.
+        file_format : string, default 'parquet'
+            'parquet', or 'feather' to save uncompressed Arrow files that are memory-mapped when read.
+
+        Returns
+        -------
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.feather as feather
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Saving as Parquet or Feather requires pyarrow. Install it with 'pip install pyarrow'.")
+        if file_format not in ['parquet', 'feather']:
+            raise Exception('Please, select a valid file format.')
+
+        for station in data.columns:
+            series = data[station]
+            series = series[series.notna()]
+            dates = series.index.values.astype('datetime64[D]')
+            metadata = {'source': source, 'variable': variable, 'station': str(station), 'consistency': consistency,
+                        'start': str(dates[0]) if len(dates) else None, 'end': str(dates[-1]) if len(dates) else None,
+                        'records': len(dates)}
+            table = pa.table({'Date': pa.array(dates, pa.date32()), 'Value': series.values},
+                             metadata={'hydrobr': json.dumps(metadata)})
+            path_station = os.path.join(path_save, 'source={}'.format(source), 'variable={}'.format(variable),
+                                        'station={}'.format(station))
+            if not os.path.exists(path_station):
+                os.makedirs(path_station)
+            # The data saved for the station in the other format is replaced as well
+            other = os.path.join(path_station, 'data.{}'.format('feather' if file_format == 'parquet' else 'parquet'))
+            if os.path.exists(other):
+                os.remove(other)
+            if file_format == 'parquet':
+                # Row groups of about ten years, so a date range reads only the row groups it overlaps
+                pq.write_table(table, os.path.join(path_station, 'data.parquet'), row_group_size=3653)
+            else:
+                feather.write_feather(table, os.path.join(path_station, 'data.feather'), compression='uncompressed')
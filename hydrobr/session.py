@@ -0,0 +1,197 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Session:
+    """
+    The HTTP layer shared by all the requests made by hydrobr.get_data.
+
+    Keeps a single pooled keep-alive connection per host, so the TCP/TLS setup is not paid for every request, and
+    retries the requests that time out, fail to connect or get a 5xx response, waiting an exponential backoff with
+    jitter between the attempts. The number of requests, retries, failures and bytes transferred is counted, see
+    Session.report().
+    """
+
+    retries = 5
+    backoff = 0.5
+    backoff_max = 60.0
+
+    _session = None
+    _pool_size = 0
+    _stats = {'requests': 0, 'retries': 0, 'failures': 0, 'bytes': 0, 'saved_requests': 0}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def configure(retries=None, backoff=None, backoff_max=None, pool_size=None):
+        """
+        Configures the retry policy and the connection pool.
+
+        Parameters
+        ----------
+        retries : int, default None
+            The number of times a failed request is retried. The default policy retries 5 times.
+        backoff : float, default None
+            The base wait in seconds before a retry, doubled on every attempt. The default is 0.5 s.
+        backoff_max : float, default None
+            The maximum wait in seconds before a retry. The default is 60 s.
+        pool_size : int, default None
+            The number of connections kept open to each host. By default it grows to the number of threads used.
+
+        Returns
+        -------
+        """
+        if retries is not None:
+            Session.retries = retries
+        if backoff is not None:
+            Session.backoff = backoff
+        if backoff_max is not None:
+            Session.backoff_max = backoff_max
+        if pool_size is not None:
+            with Session._lock:
+                Session.__mount(pool_size)
+
+    @staticmethod
+    def __mount(pool_size):
+        if Session._session is None:
+            Session._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_size)
+        Session._session.mount('http://', adapter)
+        Session._session.mount('https://', adapter)
+        Session._pool_size = pool_size
+
+    @staticmethod
+    def resize(pool_size):
+        """
+        Grows the connection pool to at least pool_size connections per host.
+
+        Parameters
+        ----------
+        pool_size : int
+            Usually the number of threads that make requests at the same time.
+
+        Returns
+        -------
+        """
+        with Session._lock:
+            if Session._session is None or Session._pool_size < pool_size:
+                Session.__mount(max(pool_size, 10))
+
+    @staticmethod
+    def record(n_requests=0, n_retries=0, n_failures=0, n_bytes=0, n_saved=0):
+        """
+        Adds to the request statistics. Used by the requests that are not made through Session.get, and by
+        hydrobr.engine.WindowPlanner to count the requests saved by adapting the size of the date windows.
+
+        Returns
+        -------
+        """
+        with Session._lock:
+            Session._stats['requests'] += n_requests
+            Session._stats['retries'] += n_retries
+            Session._stats['failures'] += n_failures
+            Session._stats['bytes'] += n_bytes
+            Session._stats['saved_requests'] += n_saved
+
+    @staticmethod
+    def stats():
+        """
+        Returns the number of requests, retries, failures, bytes transferred and requests saved by the adaptive date
+        windows since the start of the process.
+
+        Returns
+        -------
+        stats : dict
+        """
+        with Session._lock:
+            return dict(Session._stats)
+
+    @staticmethod
+    @contextmanager
+    def report():
+        """
+        Context manager that reports the requests, retries, failures, bytes transferred and requests saved by the
+        adaptive date windows inside the block.
+
+        Example
+        -------
+        >>> with hydrobr.Session.report() as report:
+        ...     data = hydrobr.get_data.ANA.flow(['58880001'])
+        >>> report
+        {'requests': 1, 'retries': 0, 'failures': 0, 'bytes': 2156305, 'saved_requests': 0}
+
+        Returns
+        -------
+        report : dict
+            Filled in when the block exits.
+        """
+        report = {}
+        start = Session.stats()
+        try:
+            yield report
+        finally:
+            end = Session.stats()
+            report.update({key: end[key] - start[key] for key in end})
+
+    @staticmethod
+    def delay(attempt):
+        """
+        Returns the exponential backoff, with jitter, in seconds to wait before the given retry attempt.
+
+        Returns
+        -------
+        delay : float
+        """
+        return min(Session.backoff_max, Session.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    @staticmethod
+    def get(url, params=None, timeout=120.0, stream=False, retry_timeouts=True):
+        """
+        Makes a GET request with the shared session, retrying timeouts, connection errors and 5xx responses.
+
+        Parameters
+        ----------
+        url : string
+            The endpoint of the request.
+        params : dict, default None
+            The query parameters of the request.
+        timeout : float, default 120.0
+            The timeout in seconds of each attempt.
+        stream : boolean, default False
+            If True, the response body is not read before returning.
+        retry_timeouts : boolean, default True
+            If False, a request that times out or gets a 504 response is not retried, e.g. because the caller splits
+            it in smaller requests instead.
+
+        Returns
+        -------
+        response : requests.Response
+            The last response, which may have a 5xx status if all the attempts failed.
+        """
+        if Session._session is None:
+            Session.resize(10)
+        attempt = 0
+        while True:
+            try:
+                response = Session._session.get(url, params=params, timeout=timeout, stream=stream)
+                if response.status_code < 500 or attempt == Session.retries or (
+                        response.status_code == 504 and not retry_timeouts):
+                    break
+                response.close()
+            except (requests.Timeout, requests.ConnectionError) as error:
+                timed_out = isinstance(error, requests.Timeout) and not isinstance(error, requests.ConnectTimeout)
+                if attempt == Session.retries or (timed_out and not retry_timeouts):
+                    Session.record(n_requests=1, n_retries=attempt, n_failures=1)
+                    raise
+            time.sleep(Session.delay(attempt))
+            attempt += 1
+        if stream:
+            size = int(response.headers.get('Content-Length', 0))
+        else:
+            size = len(response.content)
+        Session.record(n_requests=1, n_retries=attempt, n_failures=int(response.status_code >= 500), n_bytes=size)
+        return response
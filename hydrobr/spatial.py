@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+
+class SpatialIndex:
+    """
+    Spatial queries over a station inventory, such as the ones returned by ANA.list_flow, ANA.list_prec,
+    ANA.list_telemetric and INMET.list_stations.
+
+    The stations are bucketed in a regular grid of cell_size degrees, stored as the stations sorted by cell and the
+    offset of each cell, so a query only measures the stations of the cells around it. Distances are great-circle
+    (haversine) distances in km. The stations without coordinates are ignored.
+
+    Example
+    -------
+    >>> index = hydrobr.SpatialIndex(hydrobr.get_data.ANA.list_flow())
+    >>> index.radius(-22.9, -43.2, 50)
+    >>> index.nearest([-22.9, -15.8], [-43.2, -47.9], k=5)
+    """
+
+    EARTH_RADIUS = 6371.0088
+
+    def __init__(self, stations, cell_size=1.0):
+        """
+        Parameters
+        ----------
+        stations : pandas DataFrame
+            The inventory, with Latitude and Longitude columns in decimal degrees.
+        cell_size : float, default 1.0
+            The size of the grid cells in degrees.
+        """
+        latitude = pd.to_numeric(stations['Latitude'], errors='coerce').values.astype(float)
+        longitude = pd.to_numeric(stations['Longitude'], errors='coerce').values.astype(float)
+        has_coordinates = ~np.isnan(latitude) & ~np.isnan(longitude)
+        self.stations = stations
+        self.cell_size = cell_size
+        self.n_columns = int(np.ceil(360 / cell_size))
+
+        cells = self.__cell(latitude[has_coordinates], longitude[has_coordinates])
+        order = np.argsort(cells, kind='stable')
+        self.rows = np.flatnonzero(has_coordinates)[order]
+        self.latitude, self.longitude = latitude[self.rows], longitude[self.rows]
+        self.cells, self.cell_starts = np.unique(cells[order], return_index=True)
+        self.cell_ends = np.append(self.cell_starts[1:], len(order))
+
+    def __cell(self, latitude, longitude):
+        row = np.floor((np.asarray(latitude) + 90) / self.cell_size).astype(np.int64)
+        column = np.floor((np.asarray(longitude) + 180) / self.cell_size).astype(np.int64) % self.n_columns
+        return row * self.n_columns + column
+
+    def __candidates(self, min_latitude, min_longitude, max_latitude, max_longitude):
+        # Positions, in the sorted stations, of the stations in the cells that overlap the box
+        rows = np.arange(np.floor((max(min_latitude, -90) + 90) / self.cell_size),
+                         np.floor((min(max_latitude, 90) + 90) / self.cell_size) + 1).astype(np.int64)
+        if max_longitude - min_longitude >= 360:
+            columns = np.arange(self.n_columns)
+        else:
+            columns = np.arange(np.floor((min_longitude + 180) / self.cell_size),
+                                np.floor((max_longitude + 180) / self.cell_size) + 1).astype(np.int64)
+            columns = np.unique(columns % self.n_columns)
+        cells = (rows[:, None] * self.n_columns + columns).ravel()
+        found = np.searchsorted(self.cells, cells)
+        found = found[(found < len(self.cells)) & (self.cells[np.minimum(found, len(self.cells) - 1)] == cells)]
+        if len(found) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(start, end) for start, end in zip(self.cell_starts[found],
+                                                                           self.cell_ends[found])])
+
+    @staticmethod
+    def haversine(latitude1, longitude1, latitude2, longitude2):
+        """
+        Returns the great-circle distance in km between points given in decimal degrees. The arguments are broadcast.
+        """
+        latitude1, longitude1, latitude2, longitude2 = map(np.radians, (latitude1, longitude1, latitude2, longitude2))
+        a = np.sin((latitude2 - latitude1) / 2) ** 2 + \
+            np.cos(latitude1) * np.cos(latitude2) * np.sin((longitude2 - longitude1) / 2) ** 2
+        return 2 * SpatialIndex.EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+    def __box(self, latitude, longitude, radius):
+        # A box that contains the circle of the radius in km around the point
+        delta_latitude = np.degrees(radius / SpatialIndex.EARTH_RADIUS)
+        max_latitude = min(abs(latitude) + delta_latitude, 90)
+        if max_latitude >= 90:
+            delta_longitude = 180
+        else:
+            delta_longitude = min(180, np.degrees(np.arcsin(min(1, np.sin(radius / SpatialIndex.EARTH_RADIUS) /
+                                                                 np.cos(np.radians(max_latitude))))))
+        return latitude - delta_latitude, longitude - delta_longitude, latitude + delta_latitude, \
+            longitude + delta_longitude
+
+    def __result(self, positions, distances=None, targets=None):
+        result = self.stations.iloc[self.rows[positions]].copy()
+        if distances is not None:
+            result['Distance'] = distances
+        if targets is not None:
+            result.insert(0, 'Target', targets)
+        return result
+
+    def bbox(self, min_latitude, min_longitude, max_latitude, max_longitude):
+        """
+        Selects the stations inside a bounding box.
+
+        Parameters
+        ----------
+        min_latitude, min_longitude, max_latitude, max_longitude : float
+            The limits of the box in decimal degrees.
+
+        Returns
+        -------
+        list_stations : pandas DataFrame
+            The selected stations.
+        """
+        positions = self.__candidates(min_latitude, min_longitude, max_latitude, max_longitude)
+        inside = (self.latitude[positions] >= min_latitude) & (self.latitude[positions] <= max_latitude) & \
+                 (self.longitude[positions] >= min_longitude) & (self.longitude[positions] <= max_longitude)
+        return self.__result(np.sort(positions[inside]))
+
+    def __radius(self, latitude, longitude, radius):
+        positions = self.__candidates(*self.__box(latitude, longitude, radius))
+        distances = SpatialIndex.haversine(latitude, longitude, self.latitude[positions], self.longitude[positions])
+        inside = distances <= radius
+        order = np.argsort(distances[inside], kind='stable')
+        return positions[inside][order], distances[inside][order]
+
+    def radius(self, latitude, longitude, radius):
+        """
+        Selects the stations within a distance of one or many target points.
+
+        Parameters
+        ----------
+        latitude, longitude : float or list of floats
+            The coordinates of the targets in decimal degrees.
+        radius : float
+            The distance in km.
+
+        Returns
+        -------
+        list_stations : pandas DataFrame
+            The selected stations sorted by their Distance in km. For many targets, the stations of each target, whose
+            position is given in the Target column.
+        """
+        if np.ndim(latitude) == 0:
+            return self.__result(*self.__radius(latitude, longitude, radius))
+        results = [self.__radius(lat, lon, radius) for lat, lon in zip(latitude, longitude)]
+        return self.__result(np.concatenate([positions for positions, _ in results]).astype(np.int64),
+                             np.concatenate([distances for _, distances in results]),
+                             np.repeat(np.arange(len(results)), [len(positions) for positions, _ in results]))
+
+    def __nearest(self, latitude, longitude, k):
+        k = min(k, len(self.rows))
+        radius = SpatialIndex.EARTH_RADIUS * np.radians(self.cell_size)
+        # The search radius doubles until it holds k stations, which are then the k nearest ones
+        while True:
+            positions, distances = self.__radius(latitude, longitude, radius)
+            if len(positions) >= k or radius >= np.pi * SpatialIndex.EARTH_RADIUS:
+                return positions[:k], distances[:k]
+            radius *= 2
+
+    def nearest(self, latitude, longitude, k=1):
+        """
+        Selects the k nearest stations of one or many target points.
+
+        Parameters
+        ----------
+        latitude, longitude : float or list of floats
+            The coordinates of the targets in decimal degrees.
+        k : int, default 1
+            The number of stations of each target.
+
+        Returns
+        -------
+        list_stations : pandas DataFrame
+            The selected stations sorted by their Distance in km. For many targets, the stations of each target, whose
+            position is given in the Target column.
+        """
+        if np.ndim(latitude) == 0:
+            return self.__result(*self.__nearest(latitude, longitude, k))
+        results = [self.__nearest(lat, lon, k) for lat, lon in zip(latitude, longitude)]
+        return self.__result(np.concatenate([positions for positions, _ in results]).astype(np.int64),
+                             np.concatenate([distances for _, distances in results]),
+                             np.repeat(np.arange(len(results)), [len(positions) for positions, _ in results]))
+
+    def polygon(self, polygon):
+        """
+        Selects the stations inside a polygon, e.g. the boundary of a catchment.
+
+        Parameters
+        ----------
+        polygon : list of (longitude, latitude) tuples or dict
+            The vertices of the polygon, or a GeoJSON Polygon or MultiPolygon geometry. The rings are combined by the
+            even-odd rule, so the holes of a polygon are excluded.
+
+        Returns
+        -------
+        list_stations : pandas DataFrame
+            The selected stations.
+        """
+        if isinstance(polygon, dict):
+            if polygon['type'] == 'Polygon':
+                rings = polygon['coordinates']
+            elif polygon['type'] == 'MultiPolygon':
+                rings = [ring for part in polygon['coordinates'] for ring in part]
+            else:
+                raise Exception('Please, select a valid polygon.')
+        else:
+            rings = [polygon]
+        rings = [np.asarray(ring, dtype=float)[:, :2] for ring in rings]
+        vertices = np.concatenate(rings)
+        positions = self.__candidates(vertices[:, 1].min(), vertices[:, 0].min(), vertices[:, 1].max(),
+                                      vertices[:, 0].max())
+        x, y = self.longitude[positions], self.latitude[positions]
+        inside = np.zeros(len(positions), dtype=bool)
+        # Ray casting: a station is inside if a ray from it crosses the edges an odd number of times
+        for ring in rings:
+            x1, y1 = ring[:, 0], ring[:, 1]
+            x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+            crosses = (y1 > y[:, None]) != (y2 > y[:, None])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cross = x1 + (y[:, None] - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= (crosses & (x[:, None] < x_cross)).sum(axis=1) % 2 == 1
+        return self.__result(np.sort(positions[inside]))
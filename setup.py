@@ -33,5 +33,6 @@ setup(
                  "Programming Language :: Python :: 3.8",
                  "Topic :: Scientific/Engineering",
                  ],
-    install_requires=install_requires
+    install_requires=install_requires,
+    extras_require={'async': ['aiohttp>=3.7'], 'parquet': ['pyarrow>=3.0']}
 )
@@ -0,0 +1,136 @@
+import http.server
+import json
+import threading
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from hydrobr.get_data import ANA, INMET
+
+TODAY = pd.Timestamp('today').normalize()
+INMET_STATIONS = [{'CD_ESTACAO': 'A00{}'.format(i), 'TP_ESTACAO': 'Automatica' if i % 2 else 'Convencional',
+                   'DC_NOME': 'Station {}'.format(i), 'SG_ESTADO': 'MG', 'VL_LATITUDE': -19.9, 'VL_LONGITUDE': -43.9,
+                   'VL_ALTITUDE': 900, 'DT_INICIO_OPERACAO': (TODAY - pd.Timedelta(days=90 + 30 * i)).strftime(
+                       '%Y-%m-%d'), 'DT_FIM_OPERACAO': None} for i in range(3)]
+
+
+def serie_historica(code):
+    # A HidroSerieHistorica response of three years, with missing days, empty tags and months in both consistency
+    # levels
+    rng = np.random.default_rng(int(code))
+    months = []
+    for month in pd.date_range('2000-01-01', '2002-12-01', freq='MS'):
+        for level in ([1, 2] if rng.random() < 0.3 else [int(rng.integers(1, 3))]):
+            days = []
+            for day in range(1, 32):
+                draw = rng.random()
+                if draw < 0.05:
+                    continue
+                days.append('<Vazao{:02}>{}</Vazao{:02}>'.format(day, '' if draw < 0.1 else round(draw * 100, 3), day))
+            months.append('<SerieHistorica><EstacaoCodigo>{}</EstacaoCodigo><NivelConsistencia>{}</NivelConsistencia>'
+                          '<DataHora>{} 00:00:00</DataHora>{}</SerieHistorica>'.format(
+                              int(code), level, month.strftime('%Y-%m-%d'), ''.join(days)))
+    return '<DataTable><DocumentElement>{}</DocumentElement></DataTable>'.format(''.join(months))
+
+
+def telemetric(code, start, end):
+    # A DadosHidrometeorologicos response with hourly records from 60 days ago on
+    dates = pd.date_range(max(start, TODAY - pd.Timedelta(days=60)), end + pd.Timedelta(hours=23), freq='h')
+    rows = ['<DadosHidrometereologicos><CodEstacao>{}</CodEstacao><DataHora>{}</DataHora><Vazao>{}</Vazao>'
+            '<Nivel>{}</Nivel><Chuva>{}</Chuva></DadosHidrometereologicos>'.format(
+                code, date.strftime('%Y-%m-%d %H:%M:%S'), '' if i % 11 == 0 else i % 97, i % 13,
+                '' if i % 5 == 0 else 0.2) for i, date in enumerate(dates)]
+    return '<DataTable><DocumentElement>{}</DocumentElement></DataTable>'.format(''.join(rows))
+
+
+def inmet_daily(code, start, end):
+    return json.dumps([{'CHUVA': str(date.day % 4), 'TEMP_MAX': '30', 'TEMP_MED': '25.5', 'TEMP_MIN': None,
+                        'UMID_MED': '70', 'UMID_MIN': '50', 'UMID_MAX': '90', 'INSOLACAO': '8',
+                        'DT_MEDICAO': date.strftime('%Y-%m-%d'), 'UF': 'MG', 'DC_NOME': 'Station', 'CD_ESTACAO': code,
+                        'VL_LATITUDE': '-19.9', 'VL_LONGITUDE': '-43.9'} for date in pd.date_range(start, end)])
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    # Answers the requests of hydrobr to ANA and INMET with responses in the format of the providers
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        path = url.path.split('/')
+        if url.path.endswith('HidroSerieHistorica'):
+            body = serie_historica(query['codEstacao'])
+        elif url.path.endswith('DadosHidrometeorologicos'):
+            body = telemetric(query['codEstacao'], pd.to_datetime(query['dataInicio'], format='%d-%m-%Y'),
+                              pd.to_datetime(query['dataFim'], format='%d-%m-%Y'))
+        elif url.path.startswith('/estacoes/'):
+            automatic = path[-1] == 'T'
+            body = json.dumps([station for station in INMET_STATIONS
+                               if (station['TP_ESTACAO'] == 'Automatica') == automatic])
+        elif url.path.startswith('/estacao/diaria/'):
+            body = inmet_daily(path[-1], path[-3], path[-2])
+        else:
+            body = '[]'
+        body = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def stub():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = 'http://127.0.0.1:{}'.format(server.server_port)
+
+    def redirect(url):
+        return str(url).replace('http://telemetriaws1.ana.gov.br/ServiceANA.asmx', base).replace(
+            'https://apitempo.inmet.gov.br', base)
+
+    # The requests of both engines are sent to the stub server
+    monkeypatch = pytest.MonkeyPatch()
+    session_request = requests.Session.request
+    client_request = aiohttp.ClientSession._request
+    monkeypatch.setattr(requests.Session, 'request',
+                        lambda self, method, url, *args, **kwargs: session_request(self, method, redirect(url), *args,
+                                                                                   **kwargs))
+    monkeypatch.setattr(aiohttp.ClientSession, '_request',
+                        lambda self, method, url, *args, **kwargs: client_request(self, method, redirect(url), *args,
+                                                                                  **kwargs))
+    yield base
+    monkeypatch.undo()
+    server.shutdown()
+
+
+def test_flow_engines(stub):
+    stations = ['58880001', '58880002', '58880003', '58880004', '58880005']
+    data = ANA.flow(stations)
+    assert list(data.columns) == stations
+    assert data.index[0] == pd.Timestamp('2000-01-01') and data.index[-1] == pd.Timestamp('2002-12-31')
+    pd.testing.assert_frame_equal(ANA.flow(stations, engine='async', threads=3), data)
+
+
+def test_telemetric_engines(stub):
+    start_date = TODAY - pd.Timedelta(days=400)
+    data = ANA.telemetric('2001', threads=4, start_date=start_date)
+    assert list(data.columns) == ['Precipitation', 'Stage', 'Flow']
+    assert data.index[0] == TODAY - pd.Timedelta(days=60)
+    pd.testing.assert_frame_equal(ANA.telemetric('2001', threads=4, engine='async', start_date=start_date), data)
+
+
+def test_inmet_daily_engines(stub):
+    for station in INMET_STATIONS:
+        data = INMET.daily_data(station['CD_ESTACAO'])
+        assert data.index[0] == pd.Timestamp(station['DT_INICIO_OPERACAO'])
+        assert data.index[-1] == TODAY
+        pd.testing.assert_frame_equal(INMET.daily_data(station['CD_ESTACAO'], engine='async'), data)
@@ -0,0 +1,100 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from hydrobr import PreProcessing
+
+
+def reference_stations_filter(data, n_years=10, missing_percentage=5, start_date=False, end_date=False):
+    # The per-station loop of the previous PreProcessing.stations_filter, kept as the reference of the vectorized one
+    if start_date and end_date:
+        data = data.loc[pd.to_datetime(start_date):pd.to_datetime(end_date)]
+    elif start_date:
+        data = data.loc[pd.to_datetime(start_date):]
+    elif end_date:
+        data = data.loc[:pd.to_datetime(end_date)]
+    year = np.timedelta64(31556952, 's')
+
+    stations = []
+    for column in data.columns:
+        series_drop = data[column].dropna()
+        if len(series_drop) > 0 and (series_drop.index[-1] - series_drop.index[0]) / year >= n_years:
+            stations.append(column)
+    data = data[stations]
+
+    stations = []
+    for column in data.columns:
+        series = data[column]
+        series_drop = series.dropna()
+        periods = []
+        start = series_drop.index[0]
+        for i in range(1, len(series_drop)):
+            if (series_drop.index[i] - series_drop.index[i - 1]) / np.timedelta64(1, 'D') != 1:
+                periods.append((start, series_drop.index[i - 1]))
+                start = series_drop.index[i]
+        periods.append((start, series_drop.index[-1]))
+        if any((finish - start) / year >= n_years for start, finish in periods):
+            stations.append(column)
+            continue
+        for start, _ in periods[1:]:
+            if start + pd.DateOffset(years=n_years) > periods[-1][1]:
+                break
+            window = series.loc[start:start + pd.DateOffset(years=n_years)]
+            if window.isnull().sum() / len(window) <= missing_percentage / 100:
+                stations.append(column)
+                break
+    return data[stations]
+
+
+def random_stations(rng, n_stations, n_days):
+    # Daily series with missing data before and after the record, gaps of up to 200 days and scattered missing days
+    index = pd.date_range('1970-01-01', periods=n_days, freq='D')
+    values = rng.random((n_days, n_stations))
+    for column in range(n_stations):
+        first, last = sorted(rng.integers(0, n_days, 2))
+        values[:first, column] = np.nan
+        values[last:, column] = np.nan
+        for start in rng.integers(0, n_days, rng.integers(0, 40)):
+            values[start:start + rng.integers(1, 200), column] = np.nan
+        values[rng.random(n_days) < rng.random() * 0.02, column] = np.nan
+    values[:, 0] = np.nan
+    return pd.DataFrame(values, index=index, columns=[str(column) for column in range(n_stations)])
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_stations_filter_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    data = random_stations(rng, 25, 365 * 20)
+    dates = {'start_date': '1972-03-01', 'end_date': '1987-12-31'} if seed % 2 else {}
+    for n_years, missing_percentage in [(10, 5), (5, 1), (1, 0), (3, 20), (8, 10)]:
+        expected = reference_stations_filter(data, n_years, missing_percentage, **dates)
+        filtered = PreProcessing.stations_filter(data, n_years, missing_percentage, **dates)
+        pd.testing.assert_frame_equal(filtered, expected)
+
+
+def test_stations_filter_n_jobs():
+    data = random_stations(np.random.default_rng(10), 40, 365 * 20)
+    pd.testing.assert_frame_equal(PreProcessing.stations_filter(data, 5, 5, n_jobs=2),
+                                  PreProcessing.stations_filter(data, 5, 5))
+
+
+def test_stations_filter_empty():
+    data = pd.DataFrame(index=pd.date_range('2000-01-01', periods=10, freq='D'))
+    assert PreProcessing.stations_filter(data).empty
+
+
+if __name__ == '__main__':
+    # Benchmark of the vectorized stations_filter against the per-station reference, run from the root of the
+    # repository with: python -m tests.test_stations_filter
+    data = random_stations(np.random.default_rng(0), 500, 365 * 40)
+    start = time.perf_counter()
+    expected = reference_stations_filter(data)
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    filtered = PreProcessing.stations_filter(data)
+    vectorized_time = time.perf_counter() - start
+    pd.testing.assert_frame_equal(filtered, expected)
+    print('500 stations x 40 years, {} selected: reference {:.2f} s, vectorized {:.3f} s'.format(
+        len(filtered.columns), reference_time, vectorized_time))